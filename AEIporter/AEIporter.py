@@ -1,13 +1,16 @@
+import re
 import sys
-from os import path, listdir
-from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QLineEdit, QPushButton, QCheckBox, QRadioButton, QComboBox, QVBoxLayout, QHBoxLayout, QFileDialog, QMessageBox, QWidget, QButtonGroup
-from PyQt6.QtCore import Qt, QMimeData, QRect
+from os import path
+from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QLineEdit, QPushButton, QCheckBox, QRadioButton, QComboBox, QListWidget, QAbstractItemView, QSpinBox, QProgressBar, QPlainTextEdit, QVBoxLayout, QHBoxLayout, QFileDialog, QMessageBox, QWidget, QButtonGroup
+from PyQt6.QtCore import Qt, QMimeData, QRect, QThreadPool
 from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QPainter, QColor, QBrush, QPen, QFont
-from PIL import Image
-from AEPi import AEI, CompressionFormat
-from AEPi.constants import CompressionFormat
-from AEPi.exceptions import UnsupportedCompressionFormatException, AEPiException
-from AEPi.codec import compressorFor
+from . import core, batch, header, atlas, report, walker, pipeline, preprocess
+from .workers import ConversionWorker, WatchWorker
+from .inspector import InspectDialog
+from .preview import ThumbnailLoader, ThumbnailGrid, PreviewPanel
+from .thumbnails import default_disk_cache_folder
+from .queuepanel import QueuePanel
+from . import jobqueue
 
 class CustomRadioButton(QRadioButton):
     def __init__(self, text, parent=None):
@@ -34,9 +37,40 @@ class CustomRadioButton(QRadioButton):
         painter.drawText(text_rect, Qt.AlignmentFlag.AlignCenter, self.text())
 
 
+class FormatComboBox(QComboBox):
+    '''
+    Compression formats, probed (and AEPi imported) only once the box is
+    first opened or read, so the window shows without waiting for the codecs.
+    '''
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setPlaceholderText("Pick a format")
+
+    def populate(self):
+        if not self.count():
+            self.addItems(core.supported_format_names())
+            # with a placeholder Qt leaves the box unselected
+            self.setCurrentIndex(0)
+
+    def showPopup(self):
+        self.populate()
+        super().showPopup()
+
+    def currentText(self):
+        self.populate()
+        return super().currentText()
+
+
 class AEIporterApp(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.thread_pool = QThreadPool(self)
+        self.worker = None
+        self.watch_worker = None
+        self.last_result = None
+        # absolute paths of every output of this session, never taken for saved sources when watching
+        self.written_outputs = set()
+        self.thumbnail_loader = ThumbnailLoader(self, disk_folder=default_disk_cache_folder())
         self.init_ui()
 
     def init_ui(self):
@@ -54,12 +88,14 @@ class AEIporterApp(QMainWindow):
         dest_layout = QHBoxLayout()
         options_layout = QHBoxLayout()
         compression_layout = QHBoxLayout()
+        preprocess_layout = QHBoxLayout()
 
         main_layout.addLayout(conversion_layout)
         main_layout.addLayout(src_layout)
         main_layout.addLayout(dest_layout)
         main_layout.addLayout(options_layout)
         main_layout.addLayout(compression_layout)
+        main_layout.addLayout(preprocess_layout)
 
         # Conversion type selection
         self.folder_var = QCheckBox("Convert Whole Folder")
@@ -98,7 +134,36 @@ class AEIporterApp(QMainWindow):
 
         src_layout.addWidget(QLabel("Source Folder:"))
         src_layout.addWidget(self.src_folder_entry)
-        src_layout.addWidget(QPushButton("Browse", clicked=self.browse_src_folder))
+        src_folder_buttons_layout = QHBoxLayout()
+        src_folder_buttons_layout.addWidget(QPushButton("Browse", clicked=self.browse_src_folder))
+        src_folder_buttons_layout.addWidget(QPushButton("Inspect AEIs", clicked=self.inspect_src_folder))
+        src_folder_buttons_layout.addWidget(QPushButton("Thumbnails", clicked=self.show_thumbnails))
+        src_layout.addLayout(src_folder_buttons_layout)
+        src_filter_layout = QHBoxLayout()
+        self.recursive_var = QCheckBox("Include Subfolders")
+        self.recursive_var.setToolTip("Walk the source folder recursively and mirror its subfolders in the destination folder.")
+        src_filter_layout.addWidget(self.recursive_var)
+        self.include_entry = QLineEdit()
+        self.include_entry.setPlaceholderText("regex, e.g. ^ships/")
+        self.include_entry.setToolTip("Only convert files whose path relative to the source folder matches this regex.")
+        src_filter_layout.addWidget(QLabel("Include:"))
+        src_filter_layout.addWidget(self.include_entry)
+        self.exclude_entry = QLineEdit()
+        self.exclude_entry.setPlaceholderText("regex, e.g. _old\\b")
+        self.exclude_entry.setToolTip("Skip files and subfolders whose path relative to the source folder matches this regex.")
+        src_filter_layout.addWidget(QLabel("Exclude:"))
+        src_filter_layout.addWidget(self.exclude_entry)
+        src_layout.addLayout(src_filter_layout)
+
+        # Preview of the picked file and thumbnails of the source folder
+        preview_layout = QHBoxLayout()
+        self.thumbnail_grid = ThumbnailGrid(self.thumbnail_loader)
+        self.thumbnail_grid.setVisible(False)
+        self.thumbnail_grid.file_selected.connect(self.select_source_file)
+        preview_layout.addWidget(self.thumbnail_grid, 1)
+        self.preview_panel = PreviewPanel(self.thumbnail_loader)
+        preview_layout.addWidget(self.preview_panel)
+        src_layout.addLayout(preview_layout)
 
         # Destination selection
         self.dest_folder_entry = QLineEdit()
@@ -112,55 +177,132 @@ class AEIporterApp(QMainWindow):
         options_layout.addWidget(self.verbose_var)
         self.popups_var = QCheckBox("Popups")
         options_layout.addWidget(self.popups_var)
+        self.incremental_var = QCheckBox("Incremental")
+        self.incremental_var.setToolTip("Only convert files changed since the last run, tracked by a manifest in the destination folder.")
+        options_layout.addWidget(self.incremental_var)
+        self.split_textures_var = QCheckBox("Split Textures")
+        self.split_textures_var.setToolTip("AEI>PNG: save every texture of the atlas as its own <name>_<index>.png.")
+        options_layout.addWidget(self.split_textures_var)
+        options_layout.addWidget(QLabel("Export:"))
+        self.export_profile_var = QComboBox()
+        self.export_profile_var.addItems(core.EXPORT_PROFILES)
+        self.export_profile_var.setToolTip("AEI>PNG: fast writes quickly compressed PNGs for previews, small the smallest PNGs, "
+                                           "tga uncompressed TGAs and raw the bare RGBA pixels.")
+        options_layout.addWidget(self.export_profile_var)
+        self.pack_var = QCheckBox("Pack Folder")
+        self.pack_var.setToolTip("PNG>AEI with Convert Whole Folder: pack all PNGs of the folder into one AEI, a texture per PNG.")
+        options_layout.addWidget(self.pack_var)
+        options_layout.addWidget(QLabel("Jobs:"))
+        self.jobs_var = QSpinBox()
+        self.jobs_var.setRange(1, max(64, batch.default_jobs()))
+        self.jobs_var.setValue(batch.default_jobs())
+        options_layout.addWidget(self.jobs_var)
+        options_layout.addWidget(QLabel("Memory:"))
+        self.memory_budget_var = QSpinBox()
+        self.memory_budget_var.setRange(0, 1 << 20)
+        self.memory_budget_var.setSuffix(" MB")
+        self.memory_budget_var.setSpecialValueText("Unlimited")
+        self.memory_budget_var.setValue(pipeline.default_memory_budget() >> 20)
+        self.memory_budget_var.setToolTip("Decoded images allowed in flight; files wait while the budget is used up.")
+        options_layout.addWidget(self.memory_budget_var)
 
         # Compression format selection
         compression_layout.addWidget(QLabel("Compression Format:"))
-        self.compression_var = QComboBox()
-
-        supported_formats = [str(format).split('.')[-1] for format in CompressionFormat.__members__.values() if self.is_compression_supported(format)]
-        self.compression_var.addItems(supported_formats)
+        self.compression_var = FormatComboBox()
         compression_layout.addWidget(self.compression_var)
-
-        # Convert button
-        convert_button = QPushButton("Convert", clicked=self.convert_files)
-        main_layout.addWidget(convert_button)
+        self.multi_format_var = QCheckBox("Multiple Formats")
+        self.multi_format_var.setToolTip("Decode every source once and encode it into all formats selected below.")
+        compression_layout.addWidget(self.multi_format_var)
+        self.formats_list = QListWidget()
+        self.formats_list.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
+        self.formats_list.setMaximumHeight(90)
+        self.formats_list.setVisible(False)
+        self.multi_format_var.toggled.connect(self.show_formats_list)
+        main_layout.addWidget(self.formats_list)
+
+        # Pixel preparation of PNG>AEI
+        preprocess_layout.addWidget(QLabel("PNG>AEI:"))
+        self.pot_var = QComboBox()
+        self.pot_var.addItem("Keep Size", None)
+        self.pot_var.addItem("Pad to POT", "pad")
+        self.pot_var.addItem("Resize to POT", "resize")
+        preprocess_layout.addWidget(self.pot_var)
+        preprocess_layout.addWidget(QLabel("Bleed:"))
+        self.bleed_var = QSpinBox()
+        self.bleed_var.setRange(0, 64)
+        self.bleed_var.setSuffix(" px")
+        self.bleed_var.setToolTip("Spread the colour of visible pixels this far into transparent areas.")
+        preprocess_layout.addWidget(self.bleed_var)
+        self.premultiply_var = QCheckBox("Premultiply")
+        preprocess_layout.addWidget(self.premultiply_var)
+        self.mips_var = QCheckBox("Mips")
+        self.mips_var.setToolTip("Also write halved levels as <name>_<format>_mip<level>.aei.")
+        preprocess_layout.addWidget(self.mips_var)
+        if not preprocess.is_available():
+            for widget in (self.pot_var, self.bleed_var, self.premultiply_var, self.mips_var):
+                widget.setEnabled(False)
+                widget.setToolTip("Needs NumPy: pip install AEIporter[numpy]")
+
+        # Queue of dropped files, converted in one batch
+        self.queue_panel = QueuePanel()
+        self.queue_panel.file_selected.connect(self.select_source_file)
+        self.queue_panel.convert_requested.connect(self.convert_queue)
+        main_layout.addWidget(self.queue_panel)
+
+        # Convert and cancel buttons
+        buttons_layout = QHBoxLayout()
+        self.convert_button = QPushButton("Convert", clicked=self.convert_files)
+        self.cancel_button = QPushButton("Cancel", clicked=self.cancel_conversion)
+        self.cancel_button.setEnabled(False)
+        buttons_layout.addWidget(self.convert_button)
+        buttons_layout.addWidget(self.cancel_button)
+        self.watch_button = QPushButton("Watch Folder")
+        self.watch_button.setCheckable(True)
+        self.watch_button.setToolTip("Convert every file saved in the source folder from now on, in the selected direction, until clicked again.")
+        self.watch_button.toggled.connect(self.toggle_watch)
+        buttons_layout.addWidget(self.watch_button)
+        self.save_report_button = QPushButton("Save Report", clicked=self.save_report)
+        self.save_report_button.setEnabled(False)
+        buttons_layout.addWidget(self.save_report_button)
+        main_layout.addLayout(buttons_layout)
+
+        # Progress and log
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("%v / %m")
+        main_layout.addWidget(self.progress_bar)
+        self.log_view = QPlainTextEdit()
+        self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(10000)
+        main_layout.addWidget(self.log_view)
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
+        '''
+        A folder dropped on the destination field becomes the destination,
+        anything else is added to the queue.
+        '''
         drop_target = self.childAt(event.position().toPoint())
-        for url in event.mimeData().urls():
-            file_path = url.toLocalFile()
-            if file_path.endswith('.aei'):
-                self.src_aei_entry.setText(file_path)
-                if not self.aei_to_aei_radio.isChecked():
-                    self.aei_to_png_radio.setChecked(True)
-                self.folder_var.setChecked(False)
-                self.display_compression_format(file_path)
-            elif file_path.endswith('.png'):
-                self.src_png_entry.setText(file_path)
-                self.png_to_aei_radio.setChecked(True)
-                self.folder_var.setChecked(False)
-            elif path.isdir(file_path):
-                if drop_target in [self.src_aei_entry, self.src_png_entry, self.src_folder_entry]:
-                    self.src_folder_entry.setText(file_path)
-                    self.folder_var.setChecked(True)
-                else:
-                    self.dest_folder_entry.setText(file_path)
-                if not self.dest_folder_entry.text():
-                    self.dest_folder_entry.setText(file_path)
+        dropped = [url.toLocalFile() for url in event.mimeData().urls() if url.toLocalFile()]
+        if not dropped:
+            return
+        if drop_target is self.dest_folder_entry and path.isdir(dropped[0]):
+            self.dest_folder_entry.setText(dropped[0])
+            return
 
-            if not self.dest_folder_entry.text():
-                self.dest_folder_entry.setText(path.dirname(file_path))
+        path_filter = self.path_filter()
+        if path_filter is None:
+            return
+        aei_direction = jobqueue.AEI2AEI if self.aei_to_aei_radio.isChecked() else jobqueue.AEI2PNG
+        added, ignored = self.queue_panel.add_paths(dropped, aei_direction, self.recursive_var.isChecked(), path_filter)
+        self.log(f"Queued {added} file(s){f', ignored {ignored} already queued or unsupported' if ignored else ''}.")
+        if len(dropped) == 1 and path.isfile(dropped[0]) and jobqueue.infer_direction(dropped[0]):
+            self.select_source_file(dropped[0])
 
-    def is_compression_supported(self, compression_format):
-        try:
-            compressorFor(compression_format)
-            return True
-        except UnsupportedCompressionFormatException:
-            return False
+        if not self.dest_folder_entry.text():
+            self.dest_folder_entry.setText(dropped[0] if path.isdir(dropped[0]) else path.dirname(dropped[0]))
 
     def show_message(self, title, message, error=False):
         msg_box = QMessageBox(self)
@@ -177,6 +319,7 @@ class AEIporterApp(QMainWindow):
         if file_path:
             self.src_aei_entry.setText(file_path)
             self.display_compression_format(file_path)
+            self.preview_panel.show_file(file_path)
             if not self.dest_folder_entry.text():
                 self.dest_folder_entry.setText(path.dirname(file_path))
 
@@ -184,6 +327,7 @@ class AEIporterApp(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(self, "Select PNG File", "", "PNG files (*.png)")
         if file_path:
             self.src_png_entry.setText(file_path)
+            self.preview_panel.show_file(file_path)
             if not self.dest_folder_entry.text():
                 self.dest_folder_entry.setText(path.dirname(file_path))
 
@@ -207,9 +351,13 @@ class AEIporterApp(QMainWindow):
         src_folder_path = self.src_folder_entry.text()
         dest_folder_path = self.dest_folder_entry.text()
         compression_format = self.compression_var.currentText()
+        compression_formats = self.selected_formats()
         overwrite = self.overwrite_var.isChecked()
-        verbose = self.verbose_var.isChecked()
         popups = self.popups_var.isChecked()
+        png_func = core.export_textures if self.split_textures_var.isChecked() else core.convert_to_png
+        profile = self.export_profile_var.currentText()
+        if self.worker is not None:
+            return
         if not dest_folder_path or not path.isdir(dest_folder_path):
             if popups:
                 self.show_message("Error", "Please select a valid destination folder.", error=True)
@@ -223,7 +371,10 @@ class AEIporterApp(QMainWindow):
                         self.show_message("Error", "Invalid source folder path.", error=True)
                     print("Invalid source folder path.")
                     return
-                self.convert_folder_to_png(src_folder_path, dest_folder_path, overwrite, verbose)
+                sources = self.folder_sources(src_folder_path, dest_folder_path, '.aei')
+                if sources is None:
+                    return
+                self.start_batch("AEI2PNG", png_func, sources, dest_folder_path=dest_folder_path, overwrite=overwrite, profile=profile)
             else:
                 if not path.isfile(src_aei_file_path):
                     if popups:
@@ -235,7 +386,7 @@ class AEIporterApp(QMainWindow):
                         self.show_message("Error", "The selected file is not an AEI file.", error=True)
                     print("The selected file is not an AEI file.")
                     return
-                self.convert_to_png(src_aei_file_path, dest_folder_path, overwrite, verbose)
+                self.start_batch("AEI2PNG", png_func, [src_aei_file_path], dest_folder_path=dest_folder_path, overwrite=overwrite, profile=profile)
         elif conversion_type == "PNG to AEI":
             if is_folder_convert:
                 if not path.isdir(src_folder_path):
@@ -243,7 +394,13 @@ class AEIporterApp(QMainWindow):
                         self.show_message("Error", "Invalid source folder path.", error=True)
                     print("Invalid source folder path.")
                     return
-                self.convert_folder_to_aei(src_folder_path, dest_folder_path, compression_format, overwrite, verbose)
+                if self.pack_var.isChecked():
+                    self.start_batch("PACK", atlas.pack_folder_to_aei, [src_folder_path], incremental=False, dest_folder_path=dest_folder_path, compression_format=compression_format, overwrite=overwrite)
+                else:
+                    sources = self.folder_sources(src_folder_path, dest_folder_path, '.png')
+                    if sources is None:
+                        return
+                    self.start_aei_batch("PNG2AEI", sources, dest_folder_path, compression_formats, overwrite, preprocess=self.preprocess_options())
             else:
                 if not path.isfile(src_png_file_path):
                     if popups:
@@ -255,7 +412,7 @@ class AEIporterApp(QMainWindow):
                         self.show_message("Error", "The selected file is not a PNG file.", error=True)
                     print("The selected file is not a PNG file.")
                     return
-                self.convert_to_aei(src_png_file_path, dest_folder_path, compression_format, overwrite, verbose)
+                self.start_aei_batch("PNG2AEI", [src_png_file_path], dest_folder_path, compression_formats, overwrite, preprocess=self.preprocess_options())
         else:  # AEI to AEI
             if is_folder_convert:
                 if not path.isdir(src_folder_path):
@@ -263,7 +420,10 @@ class AEIporterApp(QMainWindow):
                         self.show_message("Error", "Invalid source folder path.", error=True)
                     print("Invalid source folder path.")
                     return
-                self.convert_folder_to_aei(src_folder_path, dest_folder_path, compression_format, overwrite, verbose, is_aei_to_aei=True)
+                sources = self.folder_sources(src_folder_path, dest_folder_path, '.aei')
+                if sources is None:
+                    return
+                self.start_aei_batch("AEI2AEI", sources, dest_folder_path, compression_formats, overwrite, is_aei_to_aei=True)
             else:
                 if not path.isfile(src_aei_file_path):
                     if popups:
@@ -275,154 +435,274 @@ class AEIporterApp(QMainWindow):
                         self.show_message("Error", "The selected file is not an AEI file.", error=True)
                     print("The selected file is not an AEI file.")
                     return
-                self.convert_to_aei(src_aei_file_path, dest_folder_path, compression_format, overwrite, verbose, is_aei_to_aei=True)
-        
-        if popups:
-            self.show_message("Info", "Conversion over.")
-        print("Conversion over.")
-
-    def convert_to_aei(self, file_path, dest_folder_path, compression_format, overwrite=False, verbose=False, popups=False, counter=0, is_aei_to_aei=False):
+                self.start_aei_batch("AEI2AEI", [src_aei_file_path], dest_folder_path, compression_formats, overwrite, is_aei_to_aei=True)
+
+    def path_filter(self):
+        '''
+        `walker.PathFilter` of the include/exclude regexes, None if one is invalid.
+        '''
+        include = self.include_entry.text()
+        exclude = self.exclude_entry.text()
         try:
-            compression_format_enum = getattr(CompressionFormat, compression_format)
-        except AttributeError:
-            if popups:
-                self.show_message("Error", "Invalid compression format.", error=True)
-            print("Invalid compression format.")
-            return -1
-
-        if not path.isfile(file_path):
-            if popups:
-                self.show_message("Error", "Invalid file path.", error=True)
-            print("Invalid file path.")
-            return -1
-
-        if is_aei_to_aei:
-            try:
-                with AEI.read(file_path) as aei:
-                    aei_file_path = path.join(dest_folder_path, path.splitext(path.basename(file_path))[0] + f"_{compression_format}.aei")
-                    if not overwrite and path.exists(aei_file_path):
-                        if verbose:
-                            print(f"Skipping {path.basename(file_path)} (File already exists).")
-                        return counter
-                    with open(aei_file_path, "wb") as dest_f:
-                        aei.write(dest_f, format=compression_format_enum)
-                    counter += 1
-                    if verbose:
-                        print(f"Converted {path.basename(file_path)} to {path.basename(aei_file_path)} with compression format {compression_format}")
-            except Exception as e:
-                if popups:
-                    self.show_message("Error", f"Failed to convert AEI: {str(e)}", error=True)
-                print(f"Failed to convert AEI: {str(e)}")
-                return -1
+            return walker.PathFilter([include] if include else None, [exclude] if exclude else None)
+        except re.error as e:
+            if self.popups_var.isChecked():
+                self.show_message("Error", f"Invalid filter: {e}", error=True)
+            print(f"Invalid filter: {e}")
+            return None
+
+    def folder_sources(self, src_folder_path, dest_folder_path, ext):
+        '''
+        Lazy `batch.Job`s of the source folder according to Include Subfolders
+        and the include/exclude regexes, None if a regex is invalid.
+        '''
+        path_filter = self.path_filter()
+        if path_filter is None:
+            return None
+        return batch.walk_sources(src_folder_path, ext, dest_folder_path, self.recursive_var.isChecked(), path_filter)
+
+    def convert_queue(self):
+        '''
+        Convert every queued file in one batch, each in its own direction.
+        '''
+        dest_folder_path = self.dest_folder_entry.text()
+        if self.worker is not None or not len(self.queue_panel):
+            return
+        if not dest_folder_path or not path.isdir(dest_folder_path):
+            if self.popups_var.isChecked():
+                self.show_message("Error", "Please select a valid destination folder.", error=True)
+            print("Please select a valid destination folder.")
+            return
+        tasks = self.queue_panel.queue.tasks(dest_folder_path, self.selected_formats(), self.overwrite_var.isChecked(),
+                                             self.split_textures_var.isChecked(), self.export_profile_var.currentText(), self.preprocess_options())
+        self.start_batch("QUEUE", None, tasks, dest_folder_path=dest_folder_path)
+
+    def start_batch(self, label, func, sources, incremental=None, **kwargs):
+        '''
+        Run `func` over `sources` on the worker pool, keeping the window responsive.
+        `incremental` defaults to the Incremental checkbox. Lazy `sources`
+        are walked by the worker while converting; the progress bar is busy
+        until the first file is done, then grows with the files found.
+        '''
+        if incremental is None:
+            incremental = self.incremental_var.isChecked()
+        self.batch_label = label
+        if isinstance(sources, list):
+            self.progress_bar.setRange(0, max(batch.count_outputs(func, sources, **kwargs), 1))
+            self.log(f"Starting {label} of {len(sources)} file(s).")
         else:
-            try:
-                with Image.open(file_path) as png_image:
-                    with AEI(png_image) as new_aei:
-                        aei_file_path = path.join(dest_folder_path, path.splitext(path.basename(file_path))[0] + f"_{compression_format}.aei")
-                        if not overwrite and path.exists(aei_file_path):
-                            if verbose:
-                                print(f"Skipping {path.basename(file_path)} (AEI file already exists).")
-                            return counter
-                        with open(aei_file_path, "wb") as aei_file:
-                            new_aei.write(aei_file, format=compression_format_enum)
-                        counter += 1
-                        if verbose:
-                            print(f"Converted {path.basename(file_path)} to {path.basename(aei_file_path)} with compression format {compression_format}")
-            except Exception as e:
-                if popups:
-                    self.show_message("Error", f"Failed to convert PNG to AEI: {str(e)}", error=True)
-                print(f"Failed to convert PNG to AEI: {str(e)}")
-                return -1
-        return counter
-        
-    def convert_to_png(self, aei_file_path, dest_folder_path, overwrite=False, verbose=False, popups=False, whole_image=True, counter=0):
-        if not path.isfile(aei_file_path):
-            if popups:
-                self.show_message("Error", "Invalid AEI file path.", error=True)
-            print("Invalid AEI file path.")
+            self.progress_bar.setRange(0, 0)
+            self.log(f"Starting {label}.")
+        self.progress_bar.setValue(0)
+        memory_budget = self.memory_budget_var.value() << 20 or None
+        self.worker = ConversionWorker(func, sources, jobs=self.jobs_var.value(), incremental=incremental, memory_budget=memory_budget, **kwargs)
+        self.worker.signals.progress.connect(self.on_batch_progress)
+        self.worker.signals.error.connect(self.on_batch_error)
+        self.worker.signals.finished.connect(self.on_batch_finished)
+        self.convert_button.setEnabled(False)
+        self.queue_panel.set_busy(True)
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(self.worker)
+
+    def show_formats_list(self, visible):
+        if visible and not self.formats_list.count():
+            self.formats_list.addItems(core.supported_format_names())
+        self.formats_list.setVisible(visible)
+
+    def selected_formats(self):
+        '''
+        Formats ticked in the list in Multiple Formats mode, otherwise the one of the combo box.
+        '''
+        if self.multi_format_var.isChecked():
+            selected = [item.text() for item in self.formats_list.selectedItems()]
+            if selected:
+                return selected
+        return [self.compression_var.currentText()]
+
+    def preprocess_options(self):
+        '''
+        `preprocess.Preprocess` of the PNG>AEI row, None when nothing is picked.
+        '''
+        options = preprocess.Preprocess(self.pot_var.currentData(), self.bleed_var.value(), self.premultiply_var.isChecked(), self.mips_var.isChecked())
+        if options == preprocess.Preprocess() or not preprocess.is_available():
+            return None
+        return options
+
+    def start_aei_batch(self, label, sources, dest_folder_path, compression_formats, overwrite, is_aei_to_aei=False, preprocess=None):
+        if len(compression_formats) > 1:
+            self.start_batch(label, core.convert_to_aei_formats, sources, dest_folder_path=dest_folder_path, compression_formats=compression_formats, overwrite=overwrite, is_aei_to_aei=is_aei_to_aei, preprocess=preprocess)
+        else:
+            self.start_batch(label, core.convert_to_aei, sources, dest_folder_path=dest_folder_path, compression_format=compression_formats[0], overwrite=overwrite, is_aei_to_aei=is_aei_to_aei, preprocess=preprocess)
+
+    def toggle_watch(self, checked):
+        '''
+        Start or stop watching the source folder. Saved files are converted
+        with the current direction, formats and options, always overwriting.
+        '''
+        if not checked:
+            if self.watch_worker is not None:
+                self.watch_worker.cancel()
             return
-
-        try:
-            aei = AEI.read(aei_file_path)
-        except AEPiException as ex:
-            if popups:
-                self.show_message("Error", f"Failed to read {aei_file_path} with {type(ex).__name__}: '{ex}'", error=True)
-            print(f"Failed to read {aei_file_path} with {type(ex).__name__}: '{ex}'")
-            return -1
-
-        with aei:
-            if whole_image:
-                png_file_name = f"{path.splitext(path.basename(aei_file_path))[0]}.png"
-                png_file_path = path.join(dest_folder_path, png_file_name)
-                if not overwrite and path.exists(png_file_path):
-                    if verbose:
-                        print(f"Skipping {png_file_name} (File already exists).")
-                else:
-                    aei._image.save(png_file_path)
-                    counter += 1
-                    if verbose:
-                        print(f"Converted {path.basename(aei_file_path)} to {png_file_name}")
-            else:
-                for i, tex in enumerate(aei.textures):
-                    with aei.getTexture(tex) as im:
-                        png_file_name = f"{path.splitext(path.basename(aei_file_path))[0]}_{i}.png"
-                        png_file_path = path.join(dest_folder_path, png_file_name)
-                        if not overwrite and path.exists(png_file_path):
-                            if verbose:
-                                print(f"Skipping {png_file_name} (File already exists).")
-                            continue
-                        im.save(png_file_path)
-                        counter += 1
-                        if verbose:
-                            print(f"Converted texture {i} of {path.basename(aei_file_path)} to {png_file_name}")
-        return counter
-
-    def convert_folder_to_aei(self, src_folder_path, dest_folder_path, compression_format, overwrite=False, verbose=False, popups=False, is_aei_to_aei=False):
+        if self.watch_worker is not None:
+            return
+        src_folder_path = self.src_folder_entry.text()
+        dest_folder_path = self.dest_folder_entry.text()
+        error = None
         if not path.isdir(src_folder_path):
-            if popups:
-                self.show_message("Error", "Invalid source PNGs' folder path.", error=True)
-            print("Invalid source PNG folder path.")
+            error = "Invalid source folder path."
+        elif not dest_folder_path or not path.isdir(dest_folder_path):
+            error = "Please select a valid destination folder."
+        path_filter = self.path_filter() if error is None else None
+        if error is not None or path_filter is None:
+            if error is not None:
+                if self.popups_var.isChecked():
+                    self.show_message("Error", error, error=True)
+                print(error)
+            self.watch_button.blockSignals(True)
+            self.watch_button.setChecked(False)
+            self.watch_button.blockSignals(False)
             return
 
-        file_counter = 0
-        ext = '.aei' if is_aei_to_aei else '.png'
-        for filename in listdir(src_folder_path):
-            if filename.lower().endswith(ext):
-                png_file_path = path.join(src_folder_path, filename)
-                file_counter = self.convert_to_aei(png_file_path, dest_folder_path, compression_format, overwrite=overwrite, verbose=verbose, popups=popups, counter=file_counter, is_aei_to_aei=is_aei_to_aei)
-        if popups:
-            self.show_message("Info", f"Converted PNG to AEI in count of {file_counter}.")
-        if verbose:
-            if is_aei_to_aei:
-                print(f"Converting {file_counter}x AEI2AEI over.")
+        if self.aei_to_png_radio.isChecked():
+            ext = ".aei"
+            func = core.export_textures if self.split_textures_var.isChecked() else core.convert_to_png
+            kwargs = {"profile": self.export_profile_var.currentText()}
+        else:
+            is_aei_to_aei = self.aei_to_aei_radio.isChecked()
+            ext = ".aei" if is_aei_to_aei else ".png"
+            compression_formats = self.selected_formats()
+            if len(compression_formats) > 1:
+                func = core.convert_to_aei_formats
+                kwargs = {"compression_formats": compression_formats, "is_aei_to_aei": is_aei_to_aei}
             else:
-                print(f"Converting {file_counter}x PNG2AEI over.")
-
-    def convert_folder_to_png(self, src_folder_path, dest_folder_path, overwrite=False, verbose=False, popups=False):
+                func = core.convert_to_aei
+                kwargs = {"compression_format": compression_formats[0], "is_aei_to_aei": is_aei_to_aei}
+            if not is_aei_to_aei:
+                kwargs["preprocess"] = self.preprocess_options()
+        self.watch_worker = WatchWorker(func, src_folder_path, ext, dest_folder_path, self.recursive_var.isChecked(), path_filter,
+                                        jobs=self.jobs_var.value(), incremental=self.incremental_var.isChecked(),
+                                        memory_budget=self.memory_budget_var.value() << 20 or None, ignored=self.written_outputs, **kwargs)
+        self.watch_worker.signals.started.connect(lambda method: self.log(f"Watching {src_folder_path} ({method})."))
+        self.watch_worker.signals.converted.connect(self.log_result)
+        self.watch_worker.signals.error.connect(self.on_batch_error)
+        self.watch_worker.signals.finished.connect(self.on_watch_finished)
+        self.thread_pool.start(self.watch_worker)
+
+    def on_watch_finished(self):
+        self.watch_worker = None
+        self.watch_button.blockSignals(True)
+        self.watch_button.setChecked(False)
+        self.watch_button.blockSignals(False)
+        self.log("Stopped watching.")
+
+    def cancel_conversion(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.log("Cancelling after the files in progress...")
+
+    def log(self, message):
+        self.log_view.appendPlainText(message)
+
+    def on_batch_progress(self, done, total, result):
+        if total:
+            if total != self.progress_bar.maximum():
+                self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(done)
+        self.log_result(result)
+
+    def log_result(self, result):
+        if result.status == core.CONVERTED and result.dest:
+            self.written_outputs.add(path.abspath(result.dest))
+        message = core.describe_result(result)
+        if self.verbose_var.isChecked() and result.timings:
+            message += f"  [{report.stages_text(result.timings)}]"
+        self.log(message)
+        if result.status == core.FAILED or self.verbose_var.isChecked():
+            print(message)
+
+    def on_batch_error(self, message):
+        self.log(message)
+        print(message)
+        if self.popups_var.isChecked():
+            self.show_message("Error", message, error=True)
+
+    def on_batch_finished(self, result, cancelled):
+        self.worker = None
+        self.convert_button.setEnabled(True)
+        self.queue_panel.set_busy(False)
+        self.cancel_button.setEnabled(False)
+        if self.progress_bar.maximum() == 0:
+            self.progress_bar.setRange(0, max(len(result.results), 1))
+            self.progress_bar.setValue(len(result.results))
+        summary = f"{self.batch_label} {'cancelled' if cancelled else 'over'}: converted {result.converted}, skipped {result.skipped}, failed {result.failed}."
+        self.log(summary)
+        print(summary)
+        self.last_result = result
+        self.save_report_button.setEnabled(bool(result.results))
+        if self.verbose_var.isChecked():
+            self.log(report.summary(result.results))
+        if self.popups_var.isChecked():
+            self.show_message("Info", summary)
+
+    def save_report(self):
+        if self.last_result is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Report", "aeiporter-report.json", "JSON (*.json);;CSV (*.csv)")
+        if file_path:
+            report.write_report(self.last_result.results, file_path)
+            self.log(f"Report saved to {file_path}")
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+        if self.watch_worker is not None:
+            self.watch_worker.cancel()
+        self.thread_pool.waitForDone()
+        self.thumbnail_loader.wait()
+        super().closeEvent(event)
+
+    def inspect_src_folder(self):
+        src_folder_path = self.src_folder_entry.text()
         if not path.isdir(src_folder_path):
-            if popups:
-                self.show_message("Error", "Invalid source AEIs' folder path.", error=True)
-            print("Invalid source AEI folder path.")
+            if self.popups_var.isChecked():
+                self.show_message("Error", "Invalid source folder path.", error=True)
+            print("Invalid source folder path.")
+            return
+        dialog = InspectDialog(src_folder_path, self)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.show()
+
+    def show_thumbnails(self):
+        '''
+        Fill the thumbnail grid with the AEIs and PNGs of the source folder,
+        honouring Include Subfolders and the include/exclude regexes.
+        '''
+        src_folder_path = self.src_folder_entry.text()
+        if not path.isdir(src_folder_path):
+            if self.popups_var.isChecked():
+                self.show_message("Error", "Invalid source folder path.", error=True)
+            print("Invalid source folder path.")
+            return
+        sources = self.folder_sources(src_folder_path, src_folder_path, (".aei", ".png"))
+        if sources is None:
             return
+        self.thumbnail_grid.set_files([job.src for job in sources])
+        self.thumbnail_grid.setVisible(True)
+
+    def select_source_file(self, file_path):
+        if file_path.lower().endswith(".aei"):
+            self.src_aei_entry.setText(file_path)
+            self.display_compression_format(file_path)
+        else:
+            self.src_png_entry.setText(file_path)
+        self.preview_panel.show_file(file_path)
 
-        file_counter = 0
-        for filename in listdir(src_folder_path):
-            if filename.lower().endswith('.aei'):
-                aei_file_path = path.join(src_folder_path, filename)
-                file_counter = self.convert_to_png(aei_file_path, dest_folder_path, overwrite=overwrite, verbose=verbose, popups=popups, counter=file_counter)
-        if popups:
-            self.show_message("Info", f"Converted AEI to PNG in count of {file_counter}.")
-        if verbose:
-            print(f"Converting AEI2PNG {file_counter}x over.")
-            
     def display_compression_format(self, file_path):
         try:
-            with open(file_path, "rb") as f:
-                f.seek(8)  
-                compression_byte = f.read(1)
-                compression_id = int.from_bytes(compression_byte, "little")
-                compression_format, mipmapped = CompressionFormat.fromBinary(compression_id)
-                self.src_aei_compression_label.setText(f"Format: {compression_format.name}")
+            aei_header = header.read_header(file_path)
+            mipmapped = ", mipmapped" if aei_header.mipmapped else ""
+            self.src_aei_compression_label.setText(f"Format: {aei_header.format.name}{mipmapped}, {aei_header.width}x{aei_header.height}, {len(aei_header.textures)} texture(s)")
         except Exception as e:
             self.src_aei_compression_label.setText("Format: Unknown")
             print(f"Failed to read compression format: {e}")
@@ -1,11 +1,32 @@
 #!/usr/bin/env python
-
-from . import AEIporter
+import importlib
 
 __version__ = "2024.08.03"
 
+# Qt-free submodules, imported on first attribute access so that
+# `import AEIporter` stays cheap (`AEIporter.batch.run_batch(...)` still works)
+_SUBMODULES = ("atlas", "batch", "cli", "core", "header", "jobqueue", "manifest", "pipeline",
+               "preprocess", "report", "thumbnails", "walker", "watcher")
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def _open_aeiporter_gui():
     '''
-    command-line interface
+    graphical interface, PyQt6 is only imported from here
     '''
+    from . import AEIporter
     AEIporter._runGui()
+
+
+def _run_aeiporter_cli():
+    '''
+    command-line interface
+    '''
+    import sys
+    from . import cli
+    sys.exit(cli.main())
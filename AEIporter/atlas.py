@@ -0,0 +1,113 @@
+'''
+Packing a folder of sprites into one AEI atlas with a texture table, the
+reverse of `core.export_textures`.
+'''
+import io
+import re
+from os import path, listdir
+
+from .core import ConversionResult, CONVERTED, SKIPPED, FAILED, failed_result, compression_format_for
+from .report import StageTimer
+
+
+def natural_key(file_name):
+    '''
+    Sort key putting `ship_10.png` after `ship_9.png`, so sprites exported
+    by `export_textures` are packed back in texture table order.
+    '''
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", file_name)]
+
+
+def _next_pot(value):
+    return 1 << max(0, value - 1).bit_length()
+
+
+def shelf_pack(sizes, padding=0, pot=True):
+    '''
+    Place `(width, height)` boxes on shelves, tallest first.
+    Returns `(atlas_width, atlas_height)` and the `(x, y)` of every box in input order.
+    '''
+    if not sizes:
+        raise ValueError("Nothing to pack")
+    area = sum((w + padding) * (h + padding) for w, h in sizes)
+    atlas_width = max(max(w for w, _ in sizes), int(area ** 0.5) + 1)
+    if pot:
+        atlas_width = _next_pot(atlas_width)
+
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+        w, h = sizes[i]
+        if x + w > atlas_width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        positions[i] = (x, y)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+
+    atlas_height = y + shelf_height
+    if pot:
+        atlas_height = _next_pot(atlas_height)
+    return (atlas_width, atlas_height), positions
+
+
+def aei_file_path_for_folder(src_folder_path, dest_folder_path, compression_format):
+    name = path.basename(path.normpath(src_folder_path))
+    return path.join(dest_folder_path, f"{name}_{compression_format}.aei")
+
+
+def pack_folder_to_aei(src_folder_path, dest_folder_path, compression_format, overwrite=False, padding=0, pot=True):
+    '''
+    Pack every PNG in `src_folder_path`, in natural name order, as one
+    texture each into `<folder name>_<format>.aei` in `dest_folder_path`.
+    '''
+    from PIL import Image
+    from AEPi import AEI, Texture
+    compression_format_enum = compression_format_for(compression_format)
+    if compression_format_enum is None:
+        return ConversionResult(src_folder_path, None, FAILED, "Invalid compression format.", compression_format, error_type="ValueError")
+
+    if not path.isdir(src_folder_path):
+        return ConversionResult(src_folder_path, None, FAILED, "Invalid source folder path.", compression_format, error_type="FileNotFoundError")
+
+    aei_file_path = aei_file_path_for_folder(src_folder_path, dest_folder_path, compression_format)
+    if not overwrite and path.exists(aei_file_path):
+        return ConversionResult(src_folder_path, aei_file_path, SKIPPED, None, compression_format)
+
+    file_names = sorted((f for f in listdir(src_folder_path) if f.lower().endswith(".png")), key=natural_key)
+    if not file_names:
+        return ConversionResult(src_folder_path, aei_file_path, FAILED, "No PNG files to pack.", compression_format, error_type="FileNotFoundError")
+
+    timer = StageTimer()
+    bytes_in = 0
+    sprites = []
+    try:
+        for file_name in file_names:
+            with timer("read"):
+                with open(path.join(src_folder_path, file_name), "rb") as f:
+                    data = f.read()
+            bytes_in += len(data)
+            with timer("decode"):
+                with Image.open(io.BytesIO(data)) as im:
+                    sprites.append(im.convert("RGBA"))
+        with timer("compress"):
+            shape, positions = shelf_pack([sprite.size for sprite in sprites], padding=padding, pot=pot)
+            # AEI.addTexture pastes a sprite with itself as the mask, which
+            # multiplies translucent pixels by their alpha once more
+            with Image.new("RGBA", shape) as atlas_image:
+                for sprite, (x, y) in zip(sprites, positions):
+                    atlas_image.paste(sprite, (x, y))
+                with AEI(atlas_image) as aei:
+                    for sprite, (x, y) in zip(sprites, positions):
+                        aei.addTexture(Texture(x, y, sprite.width, sprite.height))
+                    encoded = aei.write(io.BytesIO(), format=compression_format_enum).getvalue()
+        with timer("write"):
+            with open(aei_file_path, "wb") as aei_file:
+                aei_file.write(encoded)
+    except Exception as e:
+        return failed_result(src_folder_path, aei_file_path, e, compression_format, timer, bytes_in)
+    finally:
+        for sprite in sprites:
+            sprite.close()
+    return ConversionResult(src_folder_path, aei_file_path, CONVERTED, None, compression_format, timer.timings, bytes_in, len(encoded))
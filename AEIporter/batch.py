@@ -0,0 +1,288 @@
+'''
+Batch engine fanning per-file conversions out over a process pool.
+
+DXT/ETC compression in AEPi is CPU bound and holds the GIL, so the jobs run
+in separate processes. Results always come back in source order.
+'''
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from . import core, walker, pipeline
+from .manifest import Manifest
+from .preprocess import level_sizes
+
+# a source converted into its own destination folder instead of the batch
+# wide `dest_folder_path`, used to mirror source trees
+Job = namedtuple("Job", ["src", "dest_folder_path"])
+# a source with its own converter and arguments, so one batch can mix
+# conversion directions; `kwargs` take precedence over the batch wide ones
+Task = namedtuple("Task", ["func", "src", "kwargs"])
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+class BatchResult(object):
+    '''
+    Ordered per-file `ConversionResult`s together with their totals.
+    '''
+    def __init__(self, results):
+        self.results = list(results)
+
+    def count(self, status):
+        return sum(1 for result in self.results if result.status == status)
+
+    @property
+    def converted(self):
+        return self.count(core.CONVERTED)
+
+    @property
+    def skipped(self):
+        return self.count(core.SKIPPED)
+
+    @property
+    def failed(self):
+        return self.count(core.FAILED)
+
+    def __repr__(self):
+        return f"<BatchResult converted={self.converted} skipped={self.skipped} failed={self.failed}>"
+
+
+def _as_list(result):
+    return result if isinstance(result, list) else [result]
+
+
+def _unpack(func, source, kwargs):
+    '''
+    (func, src, kwargs) converting one source of a batch.
+    '''
+    if isinstance(source, Task):
+        return source.func, source.src, dict(kwargs, **source.kwargs)
+    if isinstance(source, Job):
+        return func, source.src, dict(kwargs, dest_folder_path=source.dest_folder_path)
+    return func, source, kwargs
+
+
+def _run_job(source, func, **kwargs):
+    func, src, kwargs = _unpack(func, source, kwargs)
+    if isinstance(source, (Job, Task)):
+        os.makedirs(kwargs["dest_folder_path"], exist_ok=True)
+    return func(src, **kwargs)
+
+
+def outputs_of(func, source, **kwargs):
+    '''
+    `outputs_for` of a plain path, `Job` or `Task` source.
+    '''
+    func, src, kwargs = _unpack(func, source, kwargs)
+    return outputs_for(func, src, **kwargs)
+
+
+def count_outputs(func, sources, **kwargs):
+    '''
+    Number of results a batch over the listed `sources` yields, mip levels
+    come with the result of their AEI.
+    '''
+    return sum(1 for source in sources for dest, _ in outputs_of(func, source, **kwargs) if not core.is_mip_file(dest))
+
+
+def iter_batch(func, sources, jobs=None, cancelled=None, memory_budget=None, **kwargs):
+    '''
+    Yield `func(source, **kwargs)` for every source, in source order, from
+    `jobs` processes (all cores by default). `func` has to be a picklable
+    module level function; when it returns a list of results (one source,
+    several outputs) they are yielded one by one. A source given as a `Job`
+    is written to its own destination folder, created when missing; a
+    `Task` brings its own converter, `func` may then be None.
+
+    `sources` may be a lazy iterable, it is only read a few files ahead of
+    the conversions.
+
+    `cancelled` is polled between files; once it returns True no new file is
+    started, files already running are finished and reported, then the
+    generator stops.
+
+    With a `memory_budget` in bytes the batch runs as the staged
+    `pipeline.iter_pipeline`, holding back files while the decoded images
+    in flight would exceed it.
+    '''
+    if memory_budget is not None:
+        yield from pipeline.iter_pipeline(func, sources, jobs=jobs, cancelled=cancelled, memory_budget=memory_budget, **kwargs)
+        return
+    worker = partial(_run_job, func=func, **kwargs)
+    jobs = jobs or default_jobs()
+    sources = iter(sources)
+    if jobs <= 1:
+        for source in sources:
+            if cancelled is not None and cancelled():
+                return
+            yield from _as_list(worker(source))
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+
+        def submit_ahead():
+            # keep only a couple of files per worker queued so that cancelling
+            # does not have to unwind the whole batch
+            while len(pending) < 2 * jobs:
+                source = next(sources, None)
+                if source is None:
+                    return
+                pending.append(executor.submit(worker, source))
+
+        submit_ahead()
+        while pending:
+            if cancelled is not None and cancelled():
+                # files that already started still get reported
+                for future in pending:
+                    if not future.cancel():
+                        yield from _as_list(future.result())
+                return
+            yield from _as_list(pending.popleft().result())
+            submit_ahead()
+
+
+def run_batch(func, sources, jobs=None, cancelled=None, memory_budget=None, **kwargs):
+    '''
+    Blocking counterpart of `iter_batch` collecting everything into a `BatchResult`.
+    '''
+    return BatchResult(iter_batch(func, sources, jobs=jobs, cancelled=cancelled, memory_budget=memory_budget, **kwargs))
+
+
+def outputs_for(func, source, dest_folder_path, compression_format=None, compression_formats=None, profile=core.DEFAULT_EXPORT_PROFILE,
+                preprocess=None, is_aei_to_aei=False, **kwargs):
+    '''
+    (path, format) of every file `func` writes for `source`, in the order of
+    its results. The mip levels of a `preprocess` with `mips` follow their
+    AEI, as counted from the PNG header; `core.is_mip_file` tells them apart.
+    '''
+    if func is core.convert_to_png and kwargs.get("whole_image", True):
+        return [(core.png_file_path_for(source, dest_folder_path, profile), core.export_format(profile))]
+    if func in (core.convert_to_png, core.export_textures):
+        # the first texture stands in for the whole set
+        return [(core.texture_file_path_for(source, dest_folder_path, 0, profile), core.export_format(profile))]
+    levels = 1
+    if preprocess is not None and preprocess.mips and not is_aei_to_aei:
+        dimensions = pipeline.image_dimensions(source)
+        if dimensions is not None:
+            levels = len(level_sizes(*dimensions, preprocess))
+    if func is not core.convert_to_aei_formats:
+        compression_formats = [compression_format]
+    return [(core.mip_file_path_for(core.aei_file_path_for(source, dest_folder_path, f), level), f)
+            for f in compression_formats for level in range(levels)]
+
+
+def settings_for(func, profile=core.DEFAULT_EXPORT_PROFILE, preprocess=None, is_aei_to_aei=False, **kwargs):
+    '''
+    Settings besides the format that change what `func` writes, as the
+    incremental manifest records them; None while they are all defaults.
+    '''
+    settings = {}
+    if func in (core.convert_to_png, core.export_textures) and profile != core.DEFAULT_EXPORT_PROFILE:
+        settings["profile"] = profile
+    if func in (core.convert_to_aei, core.convert_to_aei_formats) and preprocess is not None and not is_aei_to_aei:
+        # a dict, so that it reads back from the JSON as it was written
+        settings["preprocess"] = dict(preprocess._asdict())
+    return settings or None
+
+
+def iter_incremental(func, sources, jobs=None, cancelled=None, memory_budget=None, **kwargs):
+    '''
+    `iter_batch` that only converts sources changed since the last run,
+    according to the manifest in the destination folder, or converted with
+    other `settings_for` since. Stale outputs are always rewritten; up to
+    date ones come back as skipped. A source with several outputs is
+    converted again as a whole if any of them is stale.
+
+    Sources are checked as the conversions pull them, so a lazy `sources`
+    is never listed up front.
+    '''
+    manifest = Manifest.load(kwargs["dest_folder_path"])
+    kwargs["overwrite"] = True
+    # (source, outputs, settings, state, fresh) of every source checked but
+    # not reported yet, `state` is the source as checked (`Manifest.source_state`)
+    checked = deque()
+
+    def stale_sources():
+        for source in sources:
+            source_func, src, source_kwargs = _unpack(func, source, kwargs)
+            outputs = outputs_for(source_func, src, **source_kwargs)
+            settings = settings_for(source_func, **source_kwargs)
+            try:
+                state = manifest.source_state(src)
+            except OSError:
+                state = None
+            fresh = state is not None and all(manifest.is_up_to_date(src, dest, compression_format, settings, state)
+                                              for dest, compression_format in outputs)
+            if not fresh and state is not None:
+                # hashed before converting, what gets recorded is what was converted
+                try:
+                    manifest.hash_source(src, state)
+                except OSError:
+                    state = None
+            checked.append((src, outputs, settings, state, fresh))
+            if not fresh:
+                yield source._replace(kwargs=dict(source.kwargs, overwrite=True)) if isinstance(source, Task) else source
+
+    def fresh_head():
+        while checked and checked[0][4]:
+            src, outputs, _, _, _ = checked.popleft()
+            for dest, compression_format in outputs:
+                if core.is_mip_file(dest):
+                    continue
+                yield core.ConversionResult(src, dest, core.SKIPPED, "Up to date", compression_format)
+
+    converting = iter_batch(func, stale_sources(), jobs=jobs, cancelled=cancelled, memory_budget=memory_budget, **kwargs)
+    outputs = deque()
+    try:
+        for result in converting:
+            if not outputs:
+                yield from fresh_head()
+                src, source_outputs, settings, state, _ = checked.popleft()
+                outputs.extend(source_outputs)
+            dest, compression_format = outputs.popleft()
+            written = [dest]
+            while outputs and core.is_mip_file(outputs[0][0]):
+                written.append(outputs.popleft()[0])
+            if result.status == core.CONVERTED:
+                for file_path in written:
+                    manifest.record(src, file_path, compression_format, settings, state)
+            yield result
+        if cancelled is None or not cancelled():
+            yield from fresh_head()
+    finally:
+        converting.close()
+        manifest.save()
+
+
+def run_incremental(func, sources, jobs=None, cancelled=None, memory_budget=None, **kwargs):
+    return BatchResult(iter_incremental(func, sources, jobs=jobs, cancelled=cancelled, memory_budget=memory_budget, **kwargs))
+
+
+def walk_sources(src_folder_path, ext, dest_folder_path, recursive=True, path_filter=None):
+    '''
+    Lazily yield a `Job` for every file with extension `ext` under
+    `src_folder_path`, its destination mirroring the source tree in `dest_folder_path`.
+    '''
+    for file_path in walker.walk(src_folder_path, ext, recursive=recursive, path_filter=path_filter):
+        yield Job(file_path, walker.mirrored_dest_folder(file_path, src_folder_path, dest_folder_path))
+
+
+def convert_folder_to_aei(src_folder_path, dest_folder_path, compression_format, overwrite=False, is_aei_to_aei=False, jobs=None, incremental=False,
+                          recursive=False, path_filter=None):
+    ext = '.aei' if is_aei_to_aei else '.png'
+    runner = run_incremental if incremental else run_batch
+    return runner(core.convert_to_aei, walk_sources(src_folder_path, ext, dest_folder_path, recursive, path_filter), jobs=jobs,
+                  dest_folder_path=dest_folder_path, compression_format=compression_format,
+                  overwrite=overwrite, is_aei_to_aei=is_aei_to_aei)
+
+
+def convert_folder_to_png(src_folder_path, dest_folder_path, overwrite=False, jobs=None, incremental=False, recursive=False, path_filter=None,
+                          profile=core.DEFAULT_EXPORT_PROFILE):
+    runner = run_incremental if incremental else run_batch
+    return runner(core.convert_to_png, walk_sources(src_folder_path, '.aei', dest_folder_path, recursive, path_filter), jobs=jobs,
+                  dest_folder_path=dest_folder_path, overwrite=overwrite, profile=profile)
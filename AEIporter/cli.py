@@ -0,0 +1,266 @@
+'''
+Headless command-line interface.
+
+Only the Qt-free conversion core is imported here, so batch runs on build
+servers pay for Pillow and AEPi but never for PyQt6, and `--help`,
+`--version` or a bad argument pay for neither. Started without a command
+it opens the GUI instead.
+'''
+import argparse
+import glob
+import itertools
+import json
+import re
+import sys
+from os import path
+
+from . import __version__, core, batch, header, atlas, report, walker, pipeline, watcher, preprocess
+
+CONVERSIONS = {
+    "aei2png": ".aei",
+    "png2aei": ".png",
+    "aei2aei": ".aei",
+    "pack": None,
+}
+
+
+def collect_sources(inputs, ext, dest_folder_path=None, recursive=False, path_filter=None):
+    '''
+    Lazily expand files, folders and glob patterns into de-duplicated source
+    files with extension `ext`. With `recursive`, folders are walked
+    as a whole and their files come as `batch.Job`s mirroring the folder
+    layout in `dest_folder_path`.
+    '''
+    seen = set()
+    for item in inputs:
+        if path.isdir(item):
+            if recursive:
+                found = batch.walk_sources(item, ext, dest_folder_path, path_filter=path_filter)
+            else:
+                found = walker.walk(item, ext, recursive=False, path_filter=path_filter)
+        elif glob.has_magic(item):
+            found = (p for p in sorted(glob.glob(item, recursive=True)) if p.lower().endswith(ext) and path.isfile(p))
+        else:
+            found = [item]
+        for source in found:
+            key = path.abspath(source.src if isinstance(source, batch.Job) else source)
+            if key not in seen:
+                seen.add(key)
+                yield source
+
+
+def describe(file_result, timings=False):
+    '''
+    `core.describe_result`, followed by the stage timings with `timings`.
+    '''
+    description = core.describe_result(file_result)
+    if timings and file_result.timings:
+        description += f"  [{report.stages_text(file_result.timings)}]"
+    return description
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="aeiporter", description="Convert Abyss Engine Images to PNG, PNG to AEI or AEI to AEI. Run without a command to open the GUI.")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    helps = {
+        "aei2png": "convert AEI files to PNG",
+        "png2aei": "convert PNG files to AEI",
+        "aei2aei": "recompress AEI files into another format",
+        "pack": "pack every folder of PNG sprites into one AEI with a texture per sprite",
+    }
+    for command, help in helps.items():
+        sub = commands.add_parser(command, help=help)
+        if command == "pack":
+            sub.add_argument("inputs", nargs="+", metavar="FOLDER", help="folder of sprites, packed in natural name order")
+        else:
+            sub.add_argument("inputs", nargs="+", metavar="INPUT", help="file, folder or glob pattern (quote it to keep the shell from expanding it)")
+        sub.add_argument("-o", "--output", required=True, metavar="DEST", help="destination folder")
+        if command != "aei2png":
+            sub.add_argument("-f", "--format", required=True, action="append", metavar="FORMAT",
+                             help="compression format, e.g. DXT5 or ETC1; repeat it or separate by commas to encode each source into several formats")
+        if command == "aei2png":
+            sub.add_argument("-t", "--textures", action="store_true", help="save every texture of the atlas as its own <name>_<index>.png")
+            sub.add_argument("-p", "--profile", choices=list(core.EXPORT_PROFILES), default=core.DEFAULT_EXPORT_PROFILE,
+                             help="fast: quick low compression PNGs, small: smallest PNGs, tga: uncompressed TGA, "
+                                  "raw: bare RGBA pixels as .rgba (default: %(default)s)")
+        if command == "png2aei":
+            sub.add_argument("--pot", choices=preprocess.POT_MODES, help="pad (with transparent pixels) or resize images to power of two sizes")
+            sub.add_argument("--bleed", type=int, default=0, metavar="PIXELS", help="spread the colour of visible pixels PIXELS into transparent areas")
+            sub.add_argument("--premultiply", action="store_true", help="multiply colours by alpha")
+            sub.add_argument("--mips", action="store_true",
+                             help=f"also write halved levels down to {preprocess.MIN_MIP_SIZE} pixels as <name>_<format>_mip<level>.aei")
+        if command == "pack":
+            sub.add_argument("--padding", type=int, default=0, help="pixels left empty between sprites (default: 0)")
+            sub.add_argument("--no-pot", action="store_true", help="do not round the atlas size up to powers of two")
+        sub.add_argument("--overwrite", action="store_true", help="overwrite existing files")
+        if command != "pack":
+            sub.add_argument("-i", "--incremental", action="store_true", help="only convert sources changed since the last run, tracked by a manifest in DEST")
+            sub.add_argument("-r", "--recursive", action="store_true", help="walk folders recursively, mirroring their subfolders in DEST")
+            sub.add_argument("--include", action="append", metavar="REGEX", help="only take folder files whose path relative to the folder matches REGEX (repeatable)")
+            sub.add_argument("--exclude", action="append", metavar="REGEX", help="skip folder files and subfolders whose relative path matches REGEX (repeatable)")
+            sub.add_argument("--include-glob", action="append", metavar="GLOB", help="like --include with a glob matched against the relative path or file name")
+            sub.add_argument("--exclude-glob", action="append", metavar="GLOB", help="like --exclude with a glob matched against the relative path or file name")
+            sub.add_argument("-w", "--watch", action="store_true",
+                             help="after converting, keep watching the input folder and convert every file saved in it again (Ctrl+C stops)")
+            sub.add_argument("--poll", action="store_true", help="with --watch, poll the folder instead of using inotify")
+            sub.add_argument("--debounce", type=float, default=watcher.DEBOUNCE, metavar="SECONDS",
+                             help=f"with --watch, wait until no file changed for SECONDS before converting (default: {watcher.DEBOUNCE})")
+        sub.add_argument("-j", "--jobs", type=int, default=None, help=f"number of worker processes (default: {batch.default_jobs()})")
+        sub.add_argument("--memory-budget", metavar="SIZE", default=None,
+                         help="bytes of decoded images allowed in flight, e.g. 2G or 512M; 0 lifts the limit (default: half of the RAM)")
+        sub.add_argument("-v", "--verbose", action="store_true", help="print every converted or skipped file")
+        sub.add_argument("--report", metavar="FILE", help="write per-file timings, sizes and errors to FILE (.json or .csv)")
+        sub.add_argument("--summary", action="store_true", help="print the slowest files and throughput per format")
+
+    sub = commands.add_parser("inspect", help="list AEI headers without decoding pixel data")
+    sub.add_argument("inputs", nargs="+", metavar="INPUT", help="AEI file or folder (scanned recursively)")
+    sub.add_argument("--json", action="store_true", help="print JSON lines instead of a table")
+    sub.add_argument("--no-index", action="store_true", help=f"neither read nor write the {header.INDEX_FILE_NAME} cache")
+    return parser
+
+
+def inspect(args):
+    entries = []
+    for item in args.inputs:
+        if path.isdir(item):
+            entries.extend(header.scan_folder(item, use_index=not args.no_index))
+            continue
+        try:
+            entries.append(header.ScanEntry(item, path.getsize(item), None, header.read_header(item), None))
+        except Exception as e:
+            entries.append(header.ScanEntry(item, None, None, None, f"{type(e).__name__}: '{e}'"))
+
+    for entry in entries:
+        aei_header = entry.header
+        if args.json:
+            data = {"path": entry.path, "size": entry.size, "error": entry.error}
+            if aei_header is not None:
+                data.update(aei_header._asdict(), format=aei_header.format.name)
+            print(json.dumps(data))
+        elif aei_header is None:
+            print(f"{entry.path}\tunreadable: {entry.error}")
+        else:
+            print(f"{entry.path}\t{aei_header.format.name}{' mipmapped' if aei_header.mipmapped else ''}\t"
+                  f"{aei_header.width}x{aei_header.height}\t{len(aei_header.textures)} texture(s)\t{aei_header.symbol_groups} symbol group(s)")
+    return 1 if any(entry.header is None for entry in entries) else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        from . import _open_aeiporter_gui
+        _open_aeiporter_gui()
+        return 0
+    if args.command == "inspect":
+        return inspect(args)
+
+    if not path.isdir(args.output):
+        parser.error(f"destination folder '{args.output}' does not exist")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.memory_budget is None:
+        memory_budget = pipeline.default_memory_budget()
+    else:
+        try:
+            memory_budget = pipeline.parse_size(args.memory_budget) or None
+        except ValueError:
+            parser.error(f"invalid --memory-budget '{args.memory_budget}'")
+    if args.command != "aei2png":
+        args.format = [f for item in args.format for f in item.split(",") if f]
+        for compression_format in args.format:
+            if not core.is_format_name_supported(compression_format):
+                parser.error(f"unsupported compression format '{compression_format}', choose from: {', '.join(core.supported_format_names())}")
+        if args.command == "pack" and len(args.format) > 1:
+            parser.error("pack takes a single --format")
+    pixel_preprocess = None
+    if args.command == "png2aei" and (args.pot or args.bleed or args.premultiply or args.mips):
+        if args.bleed < 0:
+            parser.error("--bleed can not be negative")
+        if not preprocess.is_available():
+            parser.error("--pot, --bleed, --premultiply and --mips need NumPy: pip install AEIporter[numpy]")
+        pixel_preprocess = preprocess.Preprocess(args.pot, args.bleed, args.premultiply, args.mips)
+
+    watching = getattr(args, "watch", False)
+    if watching and (len(args.inputs) != 1 or not path.isdir(args.inputs[0])):
+        parser.error("--watch takes a single input folder")
+
+    if args.command == "pack":
+        sources = [item for item in args.inputs if path.isdir(item)]
+    else:
+        try:
+            path_filter = walker.PathFilter(args.include, args.exclude, args.include_glob, args.exclude_glob)
+        except re.error as e:
+            parser.error(f"invalid pattern: {e}")
+        sources = collect_sources(args.inputs, CONVERSIONS[args.command], args.output, args.recursive, path_filter)
+    # watch before the first run, so files saved while it converts are not missed
+    folder_watcher = watcher.open_watcher(args.inputs[0], CONVERSIONS[args.command], args.recursive, path_filter, args.poll) if watching else None
+    # peek, so an empty input fails before any worker is started
+    sources = iter(sources)
+    first = next(sources, None)
+    if first is None and not watching:
+        print("No input files found.", file=sys.stderr)
+        return 1
+    sources = itertools.chain([first], sources) if first is not None else []
+
+    if args.command == "aei2png":
+        func = core.export_textures if args.textures else core.convert_to_png
+        kwargs = {"profile": args.profile}
+    elif args.command == "pack":
+        func = atlas.pack_folder_to_aei
+        kwargs = {"compression_format": args.format[0], "padding": args.padding, "pot": not args.no_pot}
+    elif len(args.format) > 1:
+        func = core.convert_to_aei_formats
+        kwargs = {"compression_formats": args.format, "is_aei_to_aei": args.command == "aei2aei"}
+    else:
+        func = core.convert_to_aei
+        kwargs = {"compression_format": args.format[0], "is_aei_to_aei": args.command == "aei2aei"}
+    if pixel_preprocess is not None:
+        kwargs["preprocess"] = pixel_preprocess
+    incremental = getattr(args, "incremental", False)
+    runner = batch.iter_incremental if incremental else batch.iter_batch
+    results = runner(func, sources, jobs=args.jobs, memory_budget=memory_budget, dest_folder_path=args.output, overwrite=args.overwrite, **kwargs)
+
+    # print every file as it finishes instead of after the whole batch
+    collected = []
+    for file_result in results:
+        collected.append(file_result)
+        if file_result.status == core.FAILED:
+            print(core.describe_result(file_result), file=sys.stderr)
+        elif args.verbose:
+            print(describe(file_result, timings=True))
+    result = batch.BatchResult(collected)
+    if args.summary:
+        print(report.summary(result.results))
+    if args.report:
+        report.write_report(result.results, args.report)
+    print(f"Converted {result.converted}, skipped {result.skipped}, failed {result.failed}.")
+    if watching:
+        written = {path.abspath(file_result.dest) for file_result in result.results
+                   if file_result.status == core.CONVERTED and file_result.dest}
+        return watch(args, folder_watcher, func, memory_budget, incremental, kwargs, written)
+    return 1 if result.failed else 0
+
+
+def watch(args, folder_watcher, func, memory_budget, incremental, kwargs, written=None):
+    '''
+    Convert the files saved in the watched folder until interrupted. The
+    `written` outputs of the first run are not taken for saved sources.
+    '''
+    print(f"Watching {folder_watcher.src_folder_path} ({folder_watcher.method}), press Ctrl+C to stop.")
+    try:
+        with folder_watcher:
+            for file_result in watcher.iter_watch(func, folder_watcher, args.output, jobs=args.jobs, incremental=incremental,
+                                                  memory_budget=memory_budget, debounce=args.debounce, ignored=written, **kwargs):
+                if file_result.status == core.FAILED:
+                    print(core.describe_result(file_result), file=sys.stderr)
+                else:
+                    print(describe(file_result, timings=args.verbose))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
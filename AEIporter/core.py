@@ -0,0 +1,498 @@
+'''
+Qt-free conversion core.
+
+Every function here works on plain paths and returns a `ConversionResult`
+instead of printing or raising, so it can run in the GUI, in a worker
+process of the batch engine or from scripts alike.
+
+Pillow and AEPi are imported by the functions that convert, not with the
+module, so that scripts and the command line only pay for them once they
+actually decode or encode an image.
+'''
+import errno
+import io
+import os
+import re
+import shutil
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from os import path
+
+from . import header
+from .preprocess import prepare, SIXTEEN_BIT_MODES
+from .report import StageTimer
+
+CONVERTED = "converted"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# `error` carries the failure message, or the reason of a skip. `format` is
+# the output format, `timings` maps the stages of `report.STAGES` to seconds.
+ConversionResult = namedtuple("ConversionResult", ["src", "dest", "status", "error", "format", "timings", "bytes_in", "bytes_out", "error_type"],
+                              defaults=(None, None, 0, 0, None))
+
+# How AEI>PNG writes its images: the file extension, the format named in
+# results and the Pillow save options, None for a bare dump of the RGBA
+# pixels (row by row, no header, the size is the one of the AEI).
+ExportProfile = namedtuple("ExportProfile", ["extension", "format", "save_options"])
+EXPORT_PROFILES = {
+    "default": ExportProfile(".png", "PNG", {"format": "PNG"}),
+    # zlib level 1, for previews that are thrown away again
+    "fast": ExportProfile(".png", "PNG", {"format": "PNG", "compress_level": 1}),
+    # Pillow's `optimize` made RGBA atlases larger than zlib level 9 alone
+    "small": ExportProfile(".png", "PNG", {"format": "PNG", "compress_level": 9}),
+    "tga": ExportProfile(".tga", "TGA", {"format": "TGA"}),
+    "raw": ExportProfile(".rgba", "RGBA", None),
+}
+DEFAULT_EXPORT_PROFILE = "default"
+
+
+def is_compression_supported(compression_format):
+    from AEPi.codec import compressorFor
+    from AEPi.exceptions import UnsupportedCompressionFormatException
+    try:
+        compressorFor(compression_format)
+        return True
+    except UnsupportedCompressionFormatException:
+        return False
+
+
+@lru_cache(maxsize=None)
+def supported_format_names():
+    '''
+    Names of the formats the installed codecs can compress, probed once per process.
+    '''
+    from AEPi.constants import CompressionFormat
+    return tuple(format.name for format in CompressionFormat if is_compression_supported(format))
+
+
+def compression_format_for(compression_format):
+    '''
+    `CompressionFormat` member named `compression_format`, None if there is none.
+    '''
+    from AEPi.constants import CompressionFormat
+    return getattr(CompressionFormat, compression_format, None)
+
+
+def is_format_name_supported(compression_format):
+    return compression_format in supported_format_names()
+
+
+def aei_file_path_for(file_path, dest_folder_path, compression_format):
+    return path.join(dest_folder_path, path.splitext(path.basename(file_path))[0] + f"_{compression_format}.aei")
+
+
+def mip_file_path_for(aei_file_path, level):
+    '''
+    `aei_file_path` itself for level 0, `<name>_mip<level>.aei` beside it for the smaller levels.
+    '''
+    if not level:
+        return aei_file_path
+    return f"{path.splitext(aei_file_path)[0]}_mip{level}.aei"
+
+
+def is_mip_file(file_path):
+    '''
+    Whether `file_path` is a smaller level of `mip_file_path_for`, the AEIs
+    themselves end in their format instead.
+    '''
+    return re.search(r"_mip\d+\.aei$", file_path) is not None
+
+
+def png_file_path_for(aei_file_path, dest_folder_path, profile=DEFAULT_EXPORT_PROFILE):
+    return path.join(dest_folder_path, f"{path.splitext(path.basename(aei_file_path))[0]}{EXPORT_PROFILES[profile].extension}")
+
+
+def texture_file_path_for(aei_file_path, dest_folder_path, index, profile=DEFAULT_EXPORT_PROFILE):
+    return path.join(dest_folder_path, f"{path.splitext(path.basename(aei_file_path))[0]}_{index}{EXPORT_PROFILES[profile].extension}")
+
+
+def export_format(profile=DEFAULT_EXPORT_PROFILE):
+    return EXPORT_PROFILES[profile].format
+
+
+def encode_image(image, profile=DEFAULT_EXPORT_PROFILE):
+    '''
+    Bytes of the RGBA `image` written with the export `profile`.
+    '''
+    save_options = EXPORT_PROFILES[profile].save_options
+    if save_options is None:
+        return image.tobytes("raw", "RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, **save_options)
+    return buffer.getvalue()
+
+
+def describe_result(result):
+    '''
+    One line, human readable summary of `result`.
+    '''
+    src_name = path.basename(result.src)
+    if result.status == CONVERTED:
+        return f"Converted {src_name} to {path.basename(result.dest)}"
+    if result.status == SKIPPED:
+        return f"Skipping {src_name} ({result.error or 'File already exists'})."
+    return f"Failed to convert {src_name}: {result.error}"
+
+
+def failed_result(src, dest, e, compression_format, timer=None, bytes_in=0):
+    return ConversionResult(src, dest, FAILED, f"{type(e).__name__}: '{e}'", compression_format,
+                            timer.timings if timer else None, bytes_in, 0, type(e).__name__)
+
+
+def _read_file(file_path, timer):
+    with timer("read"):
+        with open(file_path, "rb") as f:
+            return f.read()
+
+
+def _write_file(file_path, data, timer):
+    with timer("write"):
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+
+def _copy_file_range(src_fd, dest_fd, size):
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dest_fd, size - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _sendfile(src_fd, dest_fd, size):
+    copied = 0
+    while copied < size:
+        n = os.sendfile(dest_fd, src_fd, copied, size - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def copy_file(src_path, dest_path):
+    '''
+    Copy `src_path` to `dest_path` without passing the bytes through user
+    space, with `os.copy_file_range` (reflinks on CoW file systems) or else
+    `os.sendfile`, falling back to a buffered copy. Returns the bytes copied.
+    '''
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        size = os.fstat(src.fileno()).st_size
+        for zero_copy, name in ((_copy_file_range, "copy_file_range"), (_sendfile, "sendfile")):
+            if not hasattr(os, name):
+                continue
+            try:
+                return zero_copy(src.fileno(), dest.fileno(), size)
+            except OSError as e:
+                # unsupported between these file systems, unless it failed half way
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF) \
+                        or os.lseek(dest.fileno(), 0, os.SEEK_CUR) != 0:
+                    raise
+                os.lseek(src.fileno(), 0, os.SEEK_SET)
+        shutil.copyfileobj(src, dest, 1 << 20)
+        return size
+
+
+def passthrough_format(file_path):
+    '''
+    Name of the compression format AEI>AEI can copy the AEI `file_path` to
+    as is, read from its header alone. None for unreadable files and for
+    mipmapped ones, which are always re-encoded.
+    '''
+    try:
+        aei_header = header.read_header(file_path)
+    except Exception:
+        return None
+    return None if aei_header.mipmapped else aei_header.format.name
+
+
+def normalize_mode(image):
+    '''
+    `image` in a mode AEPi accepts, RGB and RGBA as they are: palette and
+    grayscale images become RGBA with their transparency, 16-bit ones are
+    scaled down to 8 bits rather than clipped.
+    '''
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    if image.mode in SIXTEEN_BIT_MODES:
+        image = image.convert("I").point(lambda value: value / 257 + 0.5).convert("L")
+    return image.convert("RGBA")
+
+
+def decode(data, is_aei_to_aei=False):
+    '''
+    AEI of the encoded bytes of an AEI, or of a PNG (any Pillow image, see
+    `normalize_mode`) without `is_aei_to_aei`.
+    '''
+    from PIL import Image
+    from AEPi import AEI
+    if is_aei_to_aei:
+        return AEI.read(io.BytesIO(data))
+    with Image.open(io.BytesIO(data)) as png_image:
+        return AEI(normalize_mode(png_image))
+
+
+def decode_levels(data, is_aei_to_aei, timer, preprocess=None):
+    '''
+    AEIs to compress out of the encoded source: the decoded image, or for
+    PNG>AEI with a `preprocess.Preprocess` the prepared image followed by
+    its mip levels.
+    '''
+    if preprocess is None or is_aei_to_aei:
+        with timer("decode"):
+            return [decode(data, is_aei_to_aei)]
+    from PIL import Image
+    from AEPi import AEI
+    with Image.open(io.BytesIO(data)) as png_image:
+        with timer("decode"):
+            png_image.load()
+        with timer("preprocess"):
+            return [AEI(image) for image in prepare(png_image, preprocess)]
+
+
+def transcode_to_aei(data, compression_format_enum, is_aei_to_aei, timer, preprocess=None):
+    '''
+    In-memory decode, preprocess and compress stages of `convert_to_aei`,
+    returns the AEI bytes of every level, see `decode_levels`.
+    '''
+    levels = decode_levels(data, is_aei_to_aei, timer, preprocess)
+    with ExitStack() as stack:
+        for aei in levels:
+            stack.enter_context(aei)
+        with timer("compress"):
+            return _compress_levels(levels, compression_format_enum)
+
+
+def _compress_levels(levels, compression_format_enum):
+    '''
+    AEI bytes of the levels, the first one failing to compress raises; a
+    mip level that fails ends the chain there, it never costs the AEI itself.
+    '''
+    encoded = []
+    for level, aei in enumerate(levels):
+        try:
+            encoded.append(aei.write(io.BytesIO(), format=compression_format_enum).getvalue())
+        except Exception:
+            if not level:
+                raise
+            break
+    return encoded
+
+
+def transcode_to_png(data, timer, profile=DEFAULT_EXPORT_PROFILE):
+    '''
+    In-memory decode and encode stages of `convert_to_png`, returns the bytes
+    of the image written with the export `profile`.
+    '''
+    from AEPi import AEI
+    with timer("decode"):
+        aei = AEI.read(io.BytesIO(data))
+    with aei:
+        with timer("encode"):
+            return encode_image(aei._image, profile)
+
+
+def convert_to_aei(file_path, dest_folder_path, compression_format, overwrite=False, is_aei_to_aei=False, preprocess=None):
+    '''
+    PNG>AEI, or AEI>AEI with `is_aei_to_aei`. A `preprocess.Preprocess`
+    prepares the pixels of a PNG first; its mip levels are written beside
+    the AEI (`mip_file_path_for`) and count in the result's `bytes_out`.
+    '''
+    compression_format_enum = compression_format_for(compression_format)
+    if compression_format_enum is None:
+        return ConversionResult(file_path, None, FAILED, "Invalid compression format.", compression_format, error_type="ValueError")
+
+    if not path.isfile(file_path):
+        return ConversionResult(file_path, None, FAILED, "Invalid file path.", compression_format, error_type="FileNotFoundError")
+
+    aei_file_path = aei_file_path_for(file_path, dest_folder_path, compression_format)
+    if not overwrite and path.exists(aei_file_path):
+        return ConversionResult(file_path, aei_file_path, SKIPPED, None, compression_format)
+
+    timer = StageTimer()
+    data = b""
+    try:
+        if is_aei_to_aei and passthrough_format(file_path) == compression_format:
+            with timer("copy"):
+                copied = copy_file(file_path, aei_file_path)
+            return ConversionResult(file_path, aei_file_path, CONVERTED, None, compression_format, timer.timings, copied, copied)
+        data = _read_file(file_path, timer)
+        levels = transcode_to_aei(data, compression_format_enum, is_aei_to_aei, timer, preprocess)
+        for level, encoded in enumerate(levels):
+            _write_file(mip_file_path_for(aei_file_path, level), encoded, timer)
+    except Exception as e:
+        return failed_result(file_path, aei_file_path, e, compression_format, timer, len(data))
+    return ConversionResult(file_path, aei_file_path, CONVERTED, None, compression_format, timer.timings, len(data),
+                            sum(len(encoded) for encoded in levels))
+
+
+def _encode_aei(levels, compression_format_enum, aei_file_path):
+    '''
+    Compress and write every level, returns (timings, bytes written).
+    '''
+    timer = StageTimer()
+    with timer("compress"):
+        levels = _compress_levels(levels, compression_format_enum)
+    for level, encoded in enumerate(levels):
+        _write_file(mip_file_path_for(aei_file_path, level), encoded, timer)
+    return timer.timings, sum(len(encoded) for encoded in levels)
+
+
+def convert_to_aei_formats(file_path, dest_folder_path, compression_formats, overwrite=False, is_aei_to_aei=False, threads=None,
+                           preprocess=None):
+    '''
+    Decode `file_path` once and encode it into every format of
+    `compression_formats` concurrently, keeping the `_<format>.aei` naming.
+
+    Returns a list with one `ConversionResult` per format, in order. The read
+    and decode timings are only on the first converted format's result so
+    that summing timings over a batch counts them once. AEI>AEI copies the
+    source for its own format and only decodes it if another format is asked for.
+    '''
+    results = [None] * len(compression_formats)
+    todo = []
+    for i, compression_format in enumerate(compression_formats):
+        compression_format_enum = compression_format_for(compression_format)
+        aei_file_path = aei_file_path_for(file_path, dest_folder_path, compression_format)
+        if compression_format_enum is None:
+            results[i] = ConversionResult(file_path, None, FAILED, "Invalid compression format.", compression_format, error_type="ValueError")
+        elif not path.isfile(file_path):
+            results[i] = ConversionResult(file_path, None, FAILED, "Invalid file path.", compression_format, error_type="FileNotFoundError")
+        elif not overwrite and path.exists(aei_file_path):
+            results[i] = ConversionResult(file_path, aei_file_path, SKIPPED, None, compression_format)
+        else:
+            todo.append((i, compression_format, compression_format_enum, aei_file_path))
+
+    if is_aei_to_aei and todo:
+        source_format = passthrough_format(file_path)
+        for entry in [entry for entry in todo if entry[1] == source_format]:
+            i, compression_format, _, aei_file_path = entry
+            todo.remove(entry)
+            timer = StageTimer()
+            try:
+                with timer("copy"):
+                    copied = copy_file(file_path, aei_file_path)
+            except Exception as e:
+                results[i] = failed_result(file_path, aei_file_path, e, compression_format, timer)
+                continue
+            results[i] = ConversionResult(file_path, aei_file_path, CONVERTED, None, compression_format, timer.timings, copied, copied)
+    if not todo:
+        return results
+
+    timer = StageTimer()
+    data = b""
+    try:
+        data = _read_file(file_path, timer)
+        levels = decode_levels(data, is_aei_to_aei, timer, preprocess)
+    except Exception as e:
+        for i, compression_format, _, aei_file_path in todo:
+            results[i] = failed_result(file_path, aei_file_path, e, compression_format, timer, len(data))
+        return results
+
+    from AEPi import Texture
+    with ExitStack() as stack:
+        for aei in levels:
+            stack.enter_context(aei)
+            # AEI.write adds and removes a whole-image texture when there is none,
+            # adding it once up front keeps the concurrent writes from mutating the AEI
+            if not aei.textures and not aei.fonts:
+                aei.addTexture(Texture(0, 0, aei.width, aei.height))
+        shared_timings = timer.timings
+        with ThreadPoolExecutor(max_workers=threads or len(todo)) as executor:
+            futures = [(i, compression_format, aei_file_path, executor.submit(_encode_aei, levels, compression_format_enum, aei_file_path))
+                       for i, compression_format, compression_format_enum, aei_file_path in todo]
+            for i, compression_format, aei_file_path, future in futures:
+                try:
+                    timings, bytes_out = future.result()
+                except Exception as e:
+                    results[i] = failed_result(file_path, aei_file_path, e, compression_format, None, len(data))
+                    continue
+                results[i] = ConversionResult(file_path, aei_file_path, CONVERTED, None, compression_format,
+                                              dict(shared_timings, **timings), len(data), bytes_out)
+                shared_timings = {}
+    return results
+
+
+def convert_to_png(aei_file_path, dest_folder_path, overwrite=False, whole_image=True, profile=DEFAULT_EXPORT_PROFILE):
+    '''
+    Write the AEI image with the export `profile` (a key of
+    `EXPORT_PROFILES`). With `whole_image` off this is `export_textures`.
+    '''
+    if not whole_image:
+        return export_textures(aei_file_path, dest_folder_path, overwrite=overwrite, profile=profile)
+
+    output_format = export_format(profile)
+    if not path.isfile(aei_file_path):
+        return ConversionResult(aei_file_path, None, FAILED, "Invalid AEI file path.", output_format, error_type="FileNotFoundError")
+
+    png_file_path = png_file_path_for(aei_file_path, dest_folder_path, profile)
+    if not overwrite and path.exists(png_file_path):
+        return ConversionResult(aei_file_path, png_file_path, SKIPPED, None, output_format)
+
+    timer = StageTimer()
+    data = b""
+    try:
+        data = _read_file(aei_file_path, timer)
+        encoded = transcode_to_png(data, timer, profile)
+        _write_file(png_file_path, encoded, timer)
+    except Exception as e:
+        return failed_result(aei_file_path, png_file_path, e, output_format, timer, len(data))
+    return ConversionResult(aei_file_path, png_file_path, CONVERTED, None, output_format, timer.timings, len(data), len(encoded))
+
+
+def _save_region(image, box, file_path, profile=DEFAULT_EXPORT_PROFILE):
+    '''
+    Returns (encode seconds, write seconds, bytes written).
+    '''
+    timer = StageTimer()
+    with timer("encode"):
+        with image.crop(box) as region:
+            encoded = encode_image(region, profile)
+    _write_file(file_path, encoded, timer)
+    return timer.timings["encode"], timer.timings["write"], len(encoded)
+
+
+def export_textures(aei_file_path, dest_folder_path, overwrite=False, threads=4, profile=DEFAULT_EXPORT_PROFILE):
+    '''
+    Save every texture of the AEI atlas on its own as `<name>_<index>.png`
+    (or the extension of the export `profile`).
+
+    The atlas is decoded once and each texture is cropped straight out of
+    that buffer; the crops are encoded on `threads` threads, zlib drops
+    the GIL while compressing. `dest` of the result is the destination
+    folder, its encode and write timings are summed over the threads.
+    '''
+    from AEPi import AEI
+    output_format = export_format(profile)
+    if not path.isfile(aei_file_path):
+        return ConversionResult(aei_file_path, None, FAILED, "Invalid AEI file path.", output_format, error_type="FileNotFoundError")
+
+    timer = StageTimer()
+    data = b""
+    bytes_out = 0
+    try:
+        data = _read_file(aei_file_path, timer)
+        with timer("decode"):
+            aei = AEI.read(io.BytesIO(data))
+        with aei:
+            textures = [(tex.x, tex.y, tex.width, tex.height) for tex in aei.textures] or [(0, 0, aei.width, aei.height)]
+            jobs = []
+            for i, (x, y, width, height) in enumerate(textures):
+                texture_file_path = texture_file_path_for(aei_file_path, dest_folder_path, i, profile)
+                if overwrite or not path.exists(texture_file_path):
+                    jobs.append(((x, y, x + width, y + height), texture_file_path))
+            if not jobs:
+                return ConversionResult(aei_file_path, dest_folder_path, SKIPPED, None, output_format)
+            with ThreadPoolExecutor(max_workers=max(1, min(threads, len(jobs)))) as executor:
+                for future in [executor.submit(_save_region, aei._image, box, file_path, profile) for box, file_path in jobs]:
+                    encode_s, write_s, written = future.result()
+                    timer.add("encode", encode_s)
+                    timer.add("write", write_s)
+                    bytes_out += written
+    except Exception as e:
+        return failed_result(aei_file_path, dest_folder_path, e, output_format, timer, len(data))
+    return ConversionResult(aei_file_path, dest_folder_path, CONVERTED, None, output_format, timer.timings, len(data), bytes_out)
@@ -0,0 +1,153 @@
+'''
+Header-only AEI inspection.
+
+Reads the metadata of an AEI (format, dimensions, texture table and symbol
+groups) by seeking over the pixel data instead of decompressing it, and
+keeps the results of folder scans in an on-disk index keyed by mtime and size.
+'''
+import json
+import os
+import struct
+from collections import namedtuple
+from os import path
+
+from . import walker
+
+INDEX_FILE_NAME = ".aeiporter-index.json"
+INDEX_VERSION = 1
+
+# regions are (offset, length) tuples in bytes, `image_data` excludes the
+# length prefix of compressed formats
+AEIHeader = namedtuple("AEIHeader", ["format", "mipmapped", "width", "height", "textures",
+                                     "texture_table", "image_data", "symbols", "symbol_groups", "quality"])
+
+ScanEntry = namedtuple("ScanEntry", ["path", "size", "mtime_ns", "header", "error"])
+
+
+class AEIHeaderException(ValueError):
+    pass
+
+
+def _read(f, fmt):
+    size = struct.calcsize(fmt)
+    data = f.read(size)
+    if len(data) != size:
+        raise AEIHeaderException(f"Unexpected end of file at byte {f.tell()}")
+    return struct.unpack(fmt, data)
+
+
+def read_header(file_path):
+    # AEPi is imported with the first header, not with the module
+    from AEPi.constants import CompressionFormat, FILE_TYPE_HEADER
+    with open(file_path, "rb") as f:
+        if f.read(len(FILE_TYPE_HEADER)) != FILE_TYPE_HEADER:
+            raise AEIHeaderException("Not an AEI file")
+        compression_id, = _read(f, "<B")
+        compression_format, mipmapped = CompressionFormat.fromBinary(compression_id)
+        width, height, texture_count = _read(f, "<HHH")
+
+        texture_table_offset = f.tell()
+        textures = tuple(_read(f, "<HHHH") for _ in range(texture_count))
+        texture_table = (texture_table_offset, f.tell() - texture_table_offset)
+
+        if compression_format.isCompressed:
+            image_length, = _read(f, "<I")
+        else:
+            image_length = 4 * width * height
+        image_data = (f.tell(), image_length)
+        f.seek(image_length, os.SEEK_CUR)
+
+        symbols_offset = f.tell()
+        group_count, = _read(f, "<H")
+        for _ in range(group_count):
+            symbol_count, = _read(f, "<H")
+            # utf-16 symbols followed by their (x, y, width, height) boxes
+            f.seek(symbol_count * 10, os.SEEK_CUR)
+        symbols = (symbols_offset, f.tell() - symbols_offset)
+
+        quality_byte = f.read(1)
+        quality = quality_byte[0] if quality_byte else None
+
+    return AEIHeader(compression_format, mipmapped, width, height, textures,
+                     texture_table, image_data, symbols, group_count, quality)
+
+
+def _header_to_json(header):
+    data = header._asdict()
+    data["format"] = header.format.name
+    return data
+
+
+def _header_from_json(data):
+    from AEPi.constants import CompressionFormat
+    data = dict(data)
+    data["format"] = CompressionFormat[data["format"]]
+    data["textures"] = tuple(tuple(texture) for texture in data["textures"])
+    for region in ("texture_table", "image_data", "symbols"):
+        data[region] = tuple(data[region])
+    return AEIHeader(**data)
+
+
+def _load_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            return data.get("entries", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _save_index(index_path, entries):
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "entries": entries}, f)
+    os.replace(tmp_path, index_path)
+
+
+def scan_folder(src_folder_path, recursive=True, index_path=None, use_index=True):
+    '''
+    Header of every `.aei` under `src_folder_path` as a list of `ScanEntry`.
+
+    Headers are cached in `index_path` (`.aeiporter-index.json` in the
+    scanned folder by default); files whose size and mtime did not change
+    are not opened again.
+    '''
+    if index_path is None:
+        index_path = path.join(src_folder_path, INDEX_FILE_NAME)
+    index = _load_index(index_path) if use_index else {}
+    new_index = {}
+    entries = []
+    changed = False
+
+    for file_path in walker.walk(src_folder_path, ".aei", recursive=recursive):
+        key = path.relpath(file_path, src_folder_path).replace(os.sep, "/")
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            entries.append(ScanEntry(file_path, None, None, None, str(e)))
+            continue
+
+        cached = index.get(key)
+        header = error = None
+        if cached is not None and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            header = _header_from_json(cached["header"]) if cached["header"] else None
+            error = cached["error"]
+            new_index[key] = cached
+        else:
+            try:
+                header = read_header(file_path)
+            except Exception as e:
+                error = f"{type(e).__name__}: '{e}'"
+            new_index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                              "header": _header_to_json(header) if header else None, "error": error}
+            changed = True
+        entries.append(ScanEntry(file_path, stat.st_size, stat.st_mtime_ns, header, error))
+
+    if use_index and (changed or len(new_index) != len(index)):
+        try:
+            _save_index(index_path, new_index)
+        except OSError:
+            pass
+    return entries
@@ -0,0 +1,64 @@
+'''
+Sortable table of AEI headers for a whole folder tree.
+'''
+from os import path
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QAbstractItemView
+from PyQt6.QtCore import Qt, QThreadPool
+
+from .workers import ScanWorker
+
+COLUMNS = ["File", "Format", "Mipmapped", "Width", "Height", "Textures", "Symbol Groups",
+           "Texture Table", "Image Data", "Symbols", "Size"]
+
+
+def _region(region):
+    offset, length = region
+    return f"{offset}+{length}"
+
+
+class InspectDialog(QDialog):
+    def __init__(self, src_folder_path, parent=None):
+        super().__init__(parent)
+        self.src_folder_path = src_folder_path
+        self.setWindowTitle(f"Inspect - {src_folder_path}")
+        self.resize(1000, 600)
+
+        layout = QVBoxLayout(self)
+        self.status_label = QLabel("Scanning...")
+        layout.addWidget(self.status_label)
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
+
+        self.worker = ScanWorker(src_folder_path)
+        self.worker.signals.finished.connect(self.show_entries)
+        QThreadPool.globalInstance().start(self.worker)
+
+    def _item(self, value):
+        item = QTableWidgetItem()
+        # setting numbers as data keeps the sorting numeric
+        item.setData(Qt.ItemDataRole.DisplayRole, value)
+        return item
+
+    def show_entries(self, entries):
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(entries))
+        failed = 0
+        for row, entry in enumerate(entries):
+            self.table.setItem(row, 0, self._item(path.relpath(entry.path, self.src_folder_path)))
+            self.table.setItem(row, 10, self._item(entry.size))
+            header = entry.header
+            if header is None:
+                failed += 1
+                self.table.setItem(row, 1, self._item(f"Unreadable: {entry.error}"))
+                continue
+            values = [header.format.name, "yes" if header.mipmapped else "no", header.width, header.height,
+                      len(header.textures), header.symbol_groups, _region(header.texture_table),
+                      _region(header.image_data), _region(header.symbols)]
+            for column, value in enumerate(values, start=1):
+                self.table.setItem(row, column, self._item(value))
+        self.table.setSortingEnabled(True)
+        self.table.resizeColumnsToContents()
+        self.status_label.setText(f"{len(entries)} AEI file(s), {failed} unreadable.")
@@ -0,0 +1,109 @@
+'''
+Queue of dropped files and folders converted together in one batch.
+
+Every entry knows its own conversion direction, so PNGs and AEIs dropped
+together end up as `batch.Task`s of a single mixed batch.
+'''
+from collections import OrderedDict, namedtuple
+from os import path
+
+from . import core, batch, walker
+
+AEI2PNG = "AEI>PNG"
+PNG2AEI = "PNG>AEI"
+AEI2AEI = "AEI>AEI"
+DIRECTIONS = [AEI2PNG, PNG2AEI, AEI2AEI]
+
+# `sub_folder` is where a file found in a subfolder of a dropped folder goes
+# below the destination, mirroring the dropped tree
+QueueEntry = namedtuple("QueueEntry", ["path", "direction", "sub_folder"])
+
+
+def infer_direction(file_path, aei_direction=AEI2PNG):
+    '''
+    Direction converting `file_path`, None for files AEIporter does not read.
+    '''
+    name = file_path.lower()
+    if name.endswith(".png"):
+        return PNG2AEI
+    if name.endswith(".aei"):
+        return aei_direction
+    return None
+
+
+class JobQueue(object):
+    '''
+    Ordered entries, unique by resolved path (symlinks and `..` included).
+    '''
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def _add_file(self, file_path, aei_direction, sub_folder):
+        direction = infer_direction(file_path, aei_direction)
+        key = path.realpath(file_path)
+        if direction is None or key in self.entries:
+            return None
+        entry = QueueEntry(path.abspath(file_path), direction, sub_folder)
+        self.entries[key] = entry
+        return entry
+
+    def add(self, item_path, aei_direction=AEI2PNG, recursive=True, path_filter=None):
+        '''
+        Queue a file, or every AEI and PNG of a folder. Returns the new entries.
+        '''
+        if not path.isdir(item_path):
+            entry = self._add_file(item_path, aei_direction, "")
+            return [entry] if entry else []
+        added = []
+        root = path.normpath(item_path)
+        for file_path in walker.walk(root, (".aei", ".png"), recursive=recursive, path_filter=path_filter):
+            # files of subfolders keep their place below the dropped folder
+            sub_folder = path.relpath(path.dirname(file_path), root)
+            entry = self._add_file(file_path, aei_direction, "" if sub_folder == "." else sub_folder)
+            if entry:
+                added.append(entry)
+        return added
+
+    def set_direction(self, file_path, direction):
+        key = path.realpath(file_path)
+        entry = self.entries.get(key)
+        if entry is not None and infer_direction(entry.path, direction) == direction:
+            self.entries[key] = entry._replace(direction=direction)
+
+    def remove(self, file_path):
+        self.entries.pop(path.realpath(file_path), None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def tasks(self, dest_folder_path, compression_formats, overwrite=False, split_textures=False, profile=core.DEFAULT_EXPORT_PROFILE,
+              preprocess=None):
+        '''
+        One `batch.Task` per entry, AEIs encoded into every format of
+        `compression_formats` or exported with the export `profile`, PNGs
+        prepared with `preprocess` first.
+        '''
+        tasks = []
+        for entry in self.entries.values():
+            dest = path.join(dest_folder_path, entry.sub_folder) if entry.sub_folder else dest_folder_path
+            if entry.direction == AEI2PNG:
+                func = core.export_textures if split_textures else core.convert_to_png
+                kwargs = {"dest_folder_path": dest, "overwrite": overwrite, "profile": profile}
+            elif len(compression_formats) > 1:
+                func = core.convert_to_aei_formats
+                kwargs = {"dest_folder_path": dest, "compression_formats": list(compression_formats), "overwrite": overwrite,
+                          "is_aei_to_aei": entry.direction == AEI2AEI}
+            else:
+                func = core.convert_to_aei
+                kwargs = {"dest_folder_path": dest, "compression_format": compression_formats[0], "overwrite": overwrite,
+                          "is_aei_to_aei": entry.direction == AEI2AEI}
+            if entry.direction == PNG2AEI and preprocess is not None:
+                kwargs["preprocess"] = preprocess
+            tasks.append(batch.Task(func, entry.path, kwargs))
+        return tasks
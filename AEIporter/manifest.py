@@ -0,0 +1,134 @@
+'''
+Persistent manifest for incremental batch conversion.
+
+The manifest lives in the destination folder and remembers, per output file,
+which source it was made from (path, size, mtime and content hash) and with
+which settings (compression format, AEPi version and the non-default
+conversion settings of `batch.settings_for`). A source whose size
+and mtime did not change is trusted without reading it; otherwise it is
+hashed, so touching a file without editing it does not trigger a re-encode.
+'''
+import hashlib
+import json
+import os
+from os import path
+
+MANIFEST_FILE_NAME = ".aeiporter-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_file(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def aepi_version():
+    try:
+        from AEPi import __version__
+        return __version__
+    except ImportError:
+        return "unknown"
+
+
+class Manifest(object):
+    def __init__(self, dest_folder_path, entries=None):
+        self.dest_folder_path = dest_folder_path
+        self.manifest_path = path.join(dest_folder_path, MANIFEST_FILE_NAME)
+        self.entries = entries if entries is not None else {}
+        self.aepi_version = aepi_version()
+        self.dirty = False
+
+    @classmethod
+    def load(cls, dest_folder_path):
+        '''
+        Read the manifest of `dest_folder_path`, an unreadable or missing one
+        gives an empty manifest so that everything is converted again.
+        '''
+        manifest_path = path.join(dest_folder_path, MANIFEST_FILE_NAME)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                return cls(dest_folder_path)
+            return cls(dest_folder_path, data.get("entries", {}))
+        except (OSError, ValueError):
+            return cls(dest_folder_path)
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self.dirty = False
+
+    def _key(self, dest_file_path):
+        return path.relpath(path.abspath(dest_file_path), path.abspath(self.dest_folder_path)).replace(os.sep, "/")
+
+    def source_state(self, src_file_path):
+        '''
+        Size and mtime of the source as it is now, its hash is only taken once
+        `hash_source` needs it. Raises OSError for a missing source.
+        '''
+        stat = os.stat(src_file_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": None}
+
+    def hash_source(self, src_file_path, state):
+        if state["sha256"] is None:
+            state["sha256"] = hash_file(src_file_path)
+        return state["sha256"]
+
+    def is_up_to_date(self, src_file_path, dest_file_path, compression_format, settings=None, state=None):
+        '''
+        Whether `dest_file_path` was made from the source as it is in `state`
+        (`source_state`, taken now when not given) with these settings.
+        '''
+        entry = self.entries.get(self._key(dest_file_path))
+        if entry is None or not path.exists(dest_file_path):
+            return False
+        # entries written before settings were recorded were made with the defaults
+        if entry["source"] != path.abspath(src_file_path) \
+                or entry["format"] != compression_format \
+                or entry.get("settings") != settings \
+                or entry["aepi"] != self.aepi_version:
+            return False
+        if state is None:
+            try:
+                state = self.source_state(src_file_path)
+            except OSError:
+                return False
+        if state["size"] != entry["size"]:
+            return False
+        if state["mtime_ns"] == entry["mtime_ns"]:
+            return True
+        if self.hash_source(src_file_path, state) != entry["sha256"]:
+            return False
+        # only the timestamp moved, remember it so the next run skips hashing
+        entry["mtime_ns"] = state["mtime_ns"]
+        self.dirty = True
+        return True
+
+    def record(self, src_file_path, dest_file_path, compression_format, settings=None, state=None):
+        '''
+        Remember `dest_file_path` as made from the source in `state`, the one
+        checked before converting it; a source edited while it converted
+        then still counts as changed on the next run.
+        '''
+        if state is None:
+            state = self.source_state(src_file_path)
+        entry = {
+            "source": path.abspath(src_file_path),
+            "size": state["size"],
+            "mtime_ns": state["mtime_ns"],
+            "sha256": self.hash_source(src_file_path, state),
+            "format": compression_format,
+            "aepi": self.aepi_version,
+        }
+        if settings is not None:
+            entry["settings"] = settings
+        self.entries[self._key(dest_file_path)] = entry
+        self.dirty = True
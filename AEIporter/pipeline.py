@@ -0,0 +1,292 @@
+'''
+Staged batch pipeline under a memory budget.
+
+A reader thread reads the sources ahead, a pool decodes and encodes them in
+memory and the consuming thread writes the results in source order:
+
+    read (thread) -> decode + compress/encode (processes) -> write (caller)
+
+Before a file is read, its peak footprint is estimated from the image
+dimensions in its header and reserved from a shared `MemoryBudget`; the
+reservation is only returned once its output is written. When the budget is
+used up the reader blocks, so a batch of huge atlases keeps only as many of
+them in flight as fit, while a batch of small sprites still fills every worker.
+'''
+import os
+import queue
+import struct
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from os import path
+
+from . import core, batch, header
+from .report import StageTimer
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# the reservation of a file whose size can not be told from its header
+FALLBACK_PIXELS = 2048 * 2048
+
+
+def default_memory_budget():
+    '''
+    Half of the physical memory, 2 GiB where that can not be queried.
+    '''
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2
+    except (AttributeError, ValueError, OSError):
+        return 2 << 30
+
+
+def parse_size(text):
+    '''
+    Bytes of a size like `512M`, `4G` or `1073741824`.
+    '''
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def image_dimensions(file_path):
+    '''
+    (width, height) from the header of an AEI or PNG, None when unknown.
+    '''
+    try:
+        if file_path.lower().endswith(".aei"):
+            aei_header = header.read_header(file_path)
+            return aei_header.width, aei_header.height
+        with open(file_path, "rb") as f:
+            head = f.read(24)
+        if head[:8] == PNG_SIGNATURE and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+    except Exception:
+        pass
+    return None
+
+
+def estimate_memory(file_path, outputs=1, preprocessed=False):
+    '''
+    Peak bytes a conversion of `file_path` keeps resident: the file itself,
+    its decoded RGBA pixels, a working copy per output being encoded and
+    generously the encoded outputs. `preprocessed` adds the float32 arrays
+    of `preprocess`, for an image padded up to four times its size.
+    '''
+    dimensions = image_dimensions(file_path)
+    pixels = dimensions[0] * dimensions[1] if dimensions else FALLBACK_PIXELS
+    try:
+        file_size = path.getsize(file_path)
+    except OSError:
+        file_size = 0
+    if preprocessed:
+        pixels *= 4
+    return file_size + 4 * pixels * (1 + 2 * outputs) + (3 * 16 * pixels if preprocessed else 0)
+
+
+class MemoryBudget(object):
+    '''
+    Counting reservation of bytes. A reservation larger than the whole
+    budget is granted once nothing else is reserved, so it runs on its own
+    instead of blocking forever.
+    '''
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount, stop=None):
+        '''
+        Block until `amount` fits, False if `stop` got set meanwhile.
+        '''
+        with self._condition:
+            while self.used and self.used + amount > self.limit:
+                if stop is not None and stop.is_set():
+                    return False
+                self._condition.wait(0.1)
+            self.used += amount
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, amount):
+        with self._condition:
+            self.used -= amount
+            self._condition.notify_all()
+
+
+def _transcode(func, data, **kwargs):
+    '''
+    Decode and encode stages of the staged `func` in a worker, returns
+    (encoded bytes of every output level, timings, error).
+    '''
+    timer = StageTimer()
+    try:
+        if func is core.convert_to_png:
+            return [core.transcode_to_png(data, timer, kwargs.get("profile", core.DEFAULT_EXPORT_PROFILE))], timer.timings, None
+        return core.transcode_to_aei(data, core.compression_format_for(kwargs["compression_format"]), kwargs.get("is_aei_to_aei", False), timer,
+                                     kwargs.get("preprocess")), timer.timings, None
+    except Exception as e:
+        return None, timer.timings, e
+
+
+def _staged_dest(func, src, kwargs):
+    '''
+    Output path of `func` when it can run staged, None otherwise.
+    '''
+    if func is core.convert_to_png and kwargs.get("whole_image", True):
+        return core.png_file_path_for(src, kwargs["dest_folder_path"], kwargs.get("profile", core.DEFAULT_EXPORT_PROFILE))
+    if func is core.convert_to_aei and core.is_format_name_supported(kwargs.get("compression_format")):
+        return core.aei_file_path_for(src, kwargs["dest_folder_path"], kwargs["compression_format"])
+    return None
+
+
+# a file on its way through the pipeline, converted by `func(src, **kwargs)`;
+# `dest` is None for work that is not split into stages, `cost` is its
+# reservation, `data`/`error` the outcome of the read stage
+_Item = namedtuple("_Item", ["source", "func", "src", "kwargs", "dest", "cost", "data", "error", "timer"])
+_END = object()
+
+
+def iter_pipeline(func, sources, jobs=None, cancelled=None, memory_budget=None, **kwargs):
+    '''
+    `batch.iter_batch` as a staged pipeline keeping the estimated footprint
+    of the files in flight under `memory_budget` bytes (half of the physical
+    memory by default).
+
+    `core.convert_to_aei` and `core.convert_to_png` are split into their
+    stages, any other `func` runs whole in the pool and is only throttled.
+    Files that are skipped, invalid or copied as they are never enter the pool.
+    '''
+    jobs = jobs or batch.default_jobs()
+    budget = MemoryBudget(memory_budget or default_memory_budget())
+    read_queue = queue.Queue(maxsize=2 * jobs)
+    stop = threading.Event()
+    # an exception raised while walking `sources`, re-raised by the consumer
+    reader_error = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                read_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for source in sources:
+                item_func, src, job_kwargs = batch._unpack(func, source, kwargs)
+                dest = _staged_dest(item_func, src, job_kwargs)
+                if dest is not None and (not path.isfile(src) or (not job_kwargs.get("overwrite") and path.exists(dest))
+                                         or (job_kwargs.get("is_aei_to_aei") and core.passthrough_format(src) == job_kwargs["compression_format"])):
+                    # nothing to decode, the converter itself skips, fails or copies
+                    if not put(_Item(source, item_func, src, job_kwargs, dest, 0, None, None, None)):
+                        return
+                    continue
+                cost = estimate_memory(src, len(job_kwargs.get("compression_formats") or ()) or 1, job_kwargs.get("preprocess") is not None)
+                if not budget.acquire(cost, stop):
+                    return
+                timer = StageTimer()
+                data = error = None
+                if dest is not None:
+                    try:
+                        data = core._read_file(src, timer)
+                    except Exception as e:
+                        error = e
+                if not put(_Item(source, item_func, src, job_kwargs, dest, cost, data, error, timer)):
+                    budget.release(cost)
+                    return
+        except Exception as e:
+            reader_error.append(e)
+        finally:
+            put(_END)
+
+    def submit(executor, item):
+        if item.cost == 0 or item.error is not None:
+            return None
+        if item.dest is None:
+            return executor.submit(batch._run_job, item.source, func=func, **kwargs)
+        return executor.submit(_transcode, item.func, item.data, **item.kwargs)
+
+    def finish(item, future):
+        '''
+        Write stage, in the consuming thread.
+        '''
+        try:
+            if item.cost == 0:
+                if isinstance(item.source, (batch.Job, batch.Task)):
+                    os.makedirs(item.kwargs["dest_folder_path"], exist_ok=True)
+                return batch._as_list(item.func(item.src, **item.kwargs))
+            if item.dest is None:
+                return batch._as_list(future.result())
+            if item.func is core.convert_to_png:
+                compression_format = core.export_format(item.kwargs.get("profile", core.DEFAULT_EXPORT_PROFILE))
+            else:
+                compression_format = item.kwargs["compression_format"]
+            bytes_in = len(item.data) if item.data is not None else 0
+            error = item.error
+            if error is None:
+                encoded, timings, error = future.result()
+                for stage, seconds in timings.items():
+                    item.timer.add(stage, seconds)
+            if error is None:
+                try:
+                    if isinstance(item.source, (batch.Job, batch.Task)):
+                        os.makedirs(item.kwargs["dest_folder_path"], exist_ok=True)
+                    for level, level_encoded in enumerate(encoded):
+                        core._write_file(core.mip_file_path_for(item.dest, level), level_encoded, item.timer)
+                except Exception as e:
+                    error = e
+            if error is not None:
+                return [core.failed_result(item.src, item.dest, error, compression_format, item.timer, bytes_in)]
+            return [core.ConversionResult(item.src, item.dest, core.CONVERTED, None, compression_format,
+                                          item.timer.timings, bytes_in, sum(len(level_encoded) for level_encoded in encoded))]
+        finally:
+            budget.release(item.cost)
+
+    # a single job still overlaps reading and writing with the conversion
+    executor_class = ProcessPoolExecutor if jobs > 1 else ThreadPoolExecutor
+    reader_thread = threading.Thread(target=reader, name="aeiporter-reader", daemon=True)
+    with executor_class(max_workers=jobs) as executor:
+        reader_thread.start()
+        pending = deque()
+        reading = True
+        try:
+            while True:
+                if cancelled is not None and cancelled():
+                    stop.set()
+                    # files that already started in the pool still get reported,
+                    # the ones that never entered it (copies, skips, read errors) are dropped
+                    for item, future in pending:
+                        if future is not None and not future.cancel():
+                            yield from finish(item, future)
+                        else:
+                            budget.release(item.cost)
+                    return
+
+                while reading and len(pending) < 2 * jobs:
+                    try:
+                        # only wait for the reader when there is nothing else to do
+                        item = read_queue.get(block=not pending, timeout=0.1)
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        if reader_error:
+                            raise reader_error[0]
+                        reading = False
+                        break
+                    pending.append((item, submit(executor, item)))
+
+                if pending:
+                    yield from finish(*pending.popleft())
+                elif not reading:
+                    return
+        finally:
+            stop.set()
+            reader_thread.join()
+            while not read_queue.empty():
+                item = read_queue.get_nowait()
+                if item is not _END:
+                    budget.release(item.cost)
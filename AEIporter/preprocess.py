@@ -0,0 +1,197 @@
+'''
+Optional pixel preparation of PNG>AEI, between decoding the PNG and
+compressing it, done with NumPy on whole arrays.
+
+Every prepared image is first brought to 8-bit RGBA (palette, grayscale and
+16-bit PNGs included), then, as asked for by `Preprocess`:
+
+- `pot`: "resize" scales it to the next power of two sizes, "pad" extends
+  it to them with transparent pixels
+- `bleed`: the colour of visible pixels is spread that many pixels into the
+  fully transparent ones around them, so filtering and block compression do
+  not pull dark fringes into the edges
+- `mips`: halved levels, alpha weighted, down to `MIN_MIP_SIZE`, as long as
+  their sides stay multiples of it (the block size of DXT/ETC)
+- `premultiply`: colour multiplied by alpha, last, on every level
+
+NumPy is only needed once preprocessing is asked for,
+`pip install AEIporter[numpy]`. It is imported by the first `prepare`, the
+array functions below expect it to have run.
+'''
+import importlib.util
+from collections import namedtuple
+
+# set by `_require_numpy`, a slow import nothing else needs
+numpy = None
+
+POT_MODES = ["pad", "resize"]
+# smallest side of a mip level, the block size of the compressed formats
+MIN_MIP_SIZE = 4
+SIXTEEN_BIT_MODES = ("I", "I;16", "I;16B", "I;16L", "I;16N")
+
+Preprocess = namedtuple("Preprocess", ["pot", "bleed", "premultiply", "mips"], defaults=(None, 0, False, False))
+
+
+def is_available():
+    return numpy is not None or importlib.util.find_spec("numpy") is not None
+
+
+def _require_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("pre-processing needs NumPy, install it with `pip install AEIporter[numpy]`")
+
+
+def next_pot(value):
+    return 1 << max(value - 1, 0).bit_length()
+
+
+def to_rgba(image):
+    '''
+    Float32 (height, width, 4) array of `image` as 8-bit RGBA. 16-bit
+    grayscale is scaled down to 8 bits rather than clipped.
+    '''
+    if image.mode in SIXTEEN_BIT_MODES:
+        gray = numpy.asarray(image.convert("I") if image.mode != "I" else image, dtype=numpy.float32) / 257
+        pixels = numpy.empty(gray.shape + (4,), dtype=numpy.float32)
+        pixels[..., :3] = numpy.clip(numpy.rint(gray), 0, 255)[..., None]
+        pixels[..., 3] = 255
+        return pixels
+    return numpy.asarray(image if image.mode == "RGBA" else image.convert("RGBA"), dtype=numpy.float32)
+
+
+def pad_to_pot(pixels):
+    height, width = pixels.shape[:2]
+    return numpy.pad(pixels, ((0, next_pot(height) - height), (0, next_pot(width) - width), (0, 0)))
+
+
+def _box_sum(array):
+    '''
+    Sum over the 3x3 neighbourhood of every pixel, zeros beyond the edges,
+    as a vertical then a horizontal pass of shifted slices.
+    '''
+    columns = array.copy()
+    columns[1:] += array[:-1]
+    columns[:-1] += array[1:]
+    total = columns.copy()
+    total[:, 1:] += columns[:, :-1]
+    total[:, :-1] += columns[:, 1:]
+    return total
+
+
+def bleed(pixels, radius):
+    '''
+    Give fully transparent pixels up to `radius` pixels away from visible
+    ones the average colour of their already coloured neighbours, one ring
+    per step. Alpha stays as it is.
+    '''
+    pixels = pixels.copy()
+    visible = pixels[..., 3] > 0
+    rows = numpy.flatnonzero(visible.any(axis=1))
+    columns = numpy.flatnonzero(visible.any(axis=0))
+    if not rows.size:
+        return pixels
+    # only pixels within `radius` of the visible ones can change, sprites in a
+    # mostly empty atlas are bled in their own corner of it
+    top, left = max(rows[0] - radius, 0), max(columns[0] - radius, 0)
+    window = pixels[top:rows[-1] + radius + 1, left:columns[-1] + radius + 1]
+    known = visible[top:rows[-1] + radius + 1, left:columns[-1] + radius + 1].copy()
+    # colour of the coloured pixels and their count, summed over each neighbourhood in one go
+    weighted = numpy.empty(window.shape, dtype=numpy.float32)
+    for _ in range(radius):
+        if known.all():
+            break
+        weighted[..., 3] = known
+        weighted[..., :3] = window[..., :3] * weighted[..., 3:]
+        total = _box_sum(weighted)
+        grown = ~known & (total[..., 3] > 0)
+        window[grown, :3] = total[grown, :3] / total[grown, 3:]
+        known |= grown
+    return pixels
+
+
+def _quad_sum(array):
+    return array[0::2, 0::2] + array[1::2, 0::2] + array[0::2, 1::2] + array[1::2, 1::2]
+
+
+def half(pixels):
+    '''
+    Next mip level: 2x2 boxes, colour weighted by alpha so that transparent
+    pixels do not darken the edges. Odd sides repeat their last row or column.
+    '''
+    height, width = pixels.shape[:2]
+    if height % 2 or width % 2:
+        pixels = numpy.pad(pixels, ((0, height % 2), (0, width % 2), (0, 0)), mode="edge")
+    alpha_sum = _quad_sum(pixels[..., 3:])
+    rgb = _quad_sum(pixels[..., :3] * pixels[..., 3:]) / numpy.maximum(alpha_sum, 1e-6)
+    transparent = alpha_sum[..., 0] == 0
+    if transparent.any():
+        rgb[transparent] = _quad_sum(pixels[..., :3])[transparent] / 4
+    return numpy.concatenate([rgb, alpha_sum / 4], axis=-1)
+
+
+def _halves(width, height):
+    '''
+    Whether a `width`x`height` level gets a next one: both halves have to be
+    multiples of `MIN_MIP_SIZE`, or the block formats could not compress it.
+    '''
+    return width % (2 * MIN_MIP_SIZE) == 0 and height % (2 * MIN_MIP_SIZE) == 0
+
+
+def level_sizes(width, height, options):
+    '''
+    (width, height) of every image `prepare` makes of a `width`x`height`
+    one, without decoding it.
+    '''
+    if options.pot:
+        width, height = next_pot(width), next_pot(height)
+    sizes = [(width, height)]
+    while options.mips and _halves(width, height):
+        width, height = width // 2, height // 2
+        sizes.append((width, height))
+    return sizes
+
+
+def mip_chain(pixels):
+    '''
+    The levels below `pixels`, each half the size of the one before.
+    '''
+    levels = []
+    while _halves(pixels.shape[1], pixels.shape[0]):
+        pixels = half(pixels)
+        levels.append(pixels)
+    return levels
+
+
+def premultiply(pixels):
+    return numpy.concatenate([pixels[..., :3] * (pixels[..., 3:] / 255), pixels[..., 3:]], axis=-1)
+
+
+def prepare(image, options):
+    '''
+    RGBA Pillow images of `image` prepared according to the `Preprocess`
+    `options`: the image itself, followed by its mip levels with `mips`.
+    '''
+    from PIL import Image
+    _require_numpy()
+    if options.pot == "resize":
+        if image.mode != "RGBA":
+            image = Image.fromarray(to_rgba(image).astype(numpy.uint8), "RGBA")
+        size = (next_pot(image.width), next_pot(image.height))
+        if size != image.size:
+            # Pillow resizes RGBA premultiplied, transparent pixels do not bleed in
+            image = image.resize(size, Image.LANCZOS)
+    pixels = to_rgba(image)
+    if options.pot == "pad":
+        pixels = pad_to_pot(pixels)
+    if options.bleed:
+        pixels = bleed(pixels, options.bleed)
+    levels = [pixels]
+    if options.mips:
+        levels += mip_chain(pixels)
+    if options.premultiply:
+        levels = [premultiply(level) for level in levels]
+    return [Image.fromarray(numpy.clip(numpy.rint(level), 0, 255).astype(numpy.uint8), "RGBA") for level in levels]
@@ -0,0 +1,199 @@
+'''
+Preview panel and thumbnail grid, decoded off the GUI thread through a
+shared `thumbnails.ThumbnailCache`.
+'''
+from os import path
+from PyQt6.QtWidgets import QLabel, QListWidget, QListWidgetItem, QListView, QAbstractItemView
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QSize, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QIcon
+
+from .thumbnails import ThumbnailCache, THUMBNAIL_SIZE, PREVIEW_SIZE
+
+
+def to_qimage(image):
+    '''
+    QImage owning a copy of the pixels of an RGBA PIL image; unlike QPixmap
+    it may be built outside the GUI thread.
+    '''
+    data = image.tobytes("raw", "RGBA")
+    return QImage(data, image.width, image.height, image.width * 4, QImage.Format.Format_RGBA8888).copy()
+
+
+class ThumbnailSignals(QObject):
+    # file path, thumbnail size, QImage or None when failed or no longer wanted
+    loaded = pyqtSignal(str, int, object)
+
+
+class ThumbnailWorker(QRunnable):
+    '''
+    Loads one thumbnail through the cache, unless `wanted(file_path)` says
+    it scrolled out of view while the worker was queued.
+    '''
+    def __init__(self, cache, file_path, size, wanted=None):
+        super().__init__()
+        self.cache = cache
+        self.file_path = file_path
+        self.size = size
+        self.wanted = wanted
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        if self.wanted is not None and not self.wanted(self.file_path):
+            self.signals.loaded.emit(self.file_path, self.size, None)
+            return
+        try:
+            qimage = to_qimage(self.cache.load(self.file_path, self.size))
+        except Exception as e:
+            print(f"Failed to preview {path.basename(self.file_path)}: {e}")
+            qimage = None
+        self.signals.loaded.emit(self.file_path, self.size, qimage)
+
+
+class ThumbnailLoader(QObject):
+    '''
+    Owns the cache and the decoding threads shared by the preview widgets,
+    thumbnails are only kept on disk when `disk_folder` is given.
+    '''
+    def __init__(self, parent=None, disk_folder=None):
+        super().__init__(parent)
+        self.cache = ThumbnailCache(disk_folder=disk_folder)
+        self.thread_pool = QThreadPool(self)
+
+    def request(self, file_path, size, slot, wanted=None):
+        worker = ThumbnailWorker(self.cache, file_path, size, wanted)
+        worker.signals.loaded.connect(slot)
+        self.thread_pool.start(worker)
+
+    def clear_queue(self):
+        self.thread_pool.clear()
+
+    def wait(self):
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+
+
+class PreviewPanel(QLabel):
+    '''
+    Shows one file scaled to fit, decoded in the background.
+    '''
+    def __init__(self, loader, parent=None):
+        super().__init__(parent)
+        self.loader = loader
+        self.file_path = None
+        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setMinimumSize(160, 160)
+        self.setText("No preview")
+
+    def show_file(self, file_path):
+        self.file_path = file_path
+        if not file_path or not path.isfile(file_path):
+            self.clear()
+            self.setText("No preview")
+            return
+        image = self.loader.cache.cached(file_path, PREVIEW_SIZE)
+        if image is not None:
+            self._set_image(to_qimage(image))
+            return
+        self.setText("Loading...")
+        self.loader.request(file_path, PREVIEW_SIZE, self.on_loaded)
+
+    def on_loaded(self, file_path, size, qimage):
+        if file_path != self.file_path:
+            return
+        if qimage is None:
+            self.setText("No preview")
+        else:
+            self._set_image(qimage)
+
+    def _set_image(self, qimage):
+        pixmap = QPixmap.fromImage(qimage)
+        bounds = self.size()
+        if pixmap.width() > bounds.width() or pixmap.height() > bounds.height():
+            pixmap = pixmap.scaled(bounds, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        self.setPixmap(pixmap)
+
+
+class ThumbnailGrid(QListWidget):
+    '''
+    Icon grid of a list of files. Only thumbnails of the items in view are
+    requested, after scrolling settles, so long folders scroll smoothly.
+    '''
+    # path of the clicked file
+    file_selected = pyqtSignal(str)
+
+    def __init__(self, loader, parent=None):
+        super().__init__(parent)
+        self.loader = loader
+        self.items = {}
+        self.requested = set()
+        self.visible_paths = frozenset()
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.setGridSize(QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 32))
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.currentItemChanged.connect(self._on_current_item_changed)
+
+        self._request_timer = QTimer(self)
+        self._request_timer.setSingleShot(True)
+        self._request_timer.setInterval(50)
+        self._request_timer.timeout.connect(self.request_visible)
+        self.verticalScrollBar().valueChanged.connect(self._request_timer.start)
+
+    def set_files(self, file_paths):
+        self.loader.clear_queue()
+        self.clear()
+        self.items = {}
+        self.requested = set()
+        for file_path in file_paths:
+            item = QListWidgetItem(path.basename(file_path))
+            item.setData(Qt.ItemDataRole.UserRole, file_path)
+            item.setToolTip(file_path)
+            self.addItem(item)
+            self.items[file_path] = item
+        self._request_timer.start()
+
+    def _visible_items(self):
+        viewport = self.viewport().rect()
+        first = self.indexAt(viewport.topLeft())
+        row = first.row() if first.isValid() else 0
+        while row < self.count():
+            item = self.item(row)
+            if self.visualItemRect(item).top() > viewport.bottom():
+                break
+            yield item
+            row += 1
+
+    def request_visible(self):
+        items = list(self._visible_items())
+        self.visible_paths = frozenset(item.data(Qt.ItemDataRole.UserRole) for item in items)
+        for item in items:
+            file_path = item.data(Qt.ItemDataRole.UserRole)
+            if file_path in self.requested or not item.icon().isNull():
+                continue
+            image = self.loader.cache.cached(file_path, THUMBNAIL_SIZE)
+            if image is not None:
+                item.setIcon(QIcon(QPixmap.fromImage(to_qimage(image))))
+                continue
+            self.requested.add(file_path)
+            self.loader.request(file_path, THUMBNAIL_SIZE, self.on_loaded, self.is_visible)
+
+    def is_visible(self, file_path):
+        # read from the decoding threads, `visible_paths` is only ever replaced
+        return file_path in self.visible_paths
+
+    def on_loaded(self, file_path, size, qimage):
+        self.requested.discard(file_path)
+        item = self.items.get(file_path)
+        if item is not None and qimage is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(qimage)))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._request_timer.start()
+
+    def _on_current_item_changed(self, current, previous):
+        if current is not None:
+            self.file_selected.emit(current.data(Qt.ItemDataRole.UserRole))
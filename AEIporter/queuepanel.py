@@ -0,0 +1,105 @@
+'''
+Widget listing the `jobqueue.JobQueue` of dropped files.
+'''
+from os import path
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTreeWidget, QTreeWidgetItem, QAbstractItemView
+from PyQt6.QtCore import Qt, pyqtSignal
+
+from . import jobqueue
+
+COLUMNS = ["File", "Direction", "Destination Subfolder"]
+
+
+class QueuePanel(QWidget):
+    '''
+    Shows the queue; double-clicking an AEI switches it between AEI>PNG and AEI>AEI.
+    '''
+    # path of the file picked in the list
+    file_selected = pyqtSignal(str)
+    convert_requested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.queue = jobqueue.JobQueue()
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(COLUMNS)
+        self.tree.setRootIsDecorated(False)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tree.currentItemChanged.connect(self._on_current_item_changed)
+        self.tree.itemDoubleClicked.connect(self._toggle_direction)
+        layout.addWidget(self.tree)
+
+        buttons_layout = QHBoxLayout()
+        self.convert_button = QPushButton("Convert Queue", clicked=self.convert_requested.emit)
+        buttons_layout.addWidget(self.convert_button)
+        buttons_layout.addWidget(QPushButton("Remove Selected", clicked=self.remove_selected))
+        buttons_layout.addWidget(QPushButton("Clear Queue", clicked=self.clear))
+        layout.addLayout(buttons_layout)
+        self.busy = False
+        self._update_status()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def _update_status(self):
+        counts = {direction: 0 for direction in jobqueue.DIRECTIONS}
+        for entry in self.queue:
+            counts[entry.direction] += 1
+        details = ", ".join(f"{count} {direction}" for direction, count in counts.items() if count)
+        self.status_label.setText(f"Queue: {len(self.queue)} file(s){f' ({details})' if details else ''}. Drop files or folders to add them.")
+        self.convert_button.setEnabled(bool(self.queue) and not self.busy)
+
+    def set_busy(self, busy):
+        '''
+        Keeps Convert Queue disabled while a batch is running.
+        '''
+        self.busy = busy
+        self._update_status()
+
+    def add_paths(self, item_paths, aei_direction=jobqueue.AEI2PNG, recursive=True, path_filter=None):
+        '''
+        Queue dropped files and folders, returns (added, already queued or unsupported).
+        '''
+        added = ignored = 0
+        for item_path in item_paths:
+            entries = self.queue.add(item_path, aei_direction, recursive, path_filter)
+            if not entries and not path.isdir(item_path):
+                ignored += 1
+            for entry in entries:
+                item = QTreeWidgetItem([path.basename(entry.path), entry.direction, entry.sub_folder])
+                item.setData(0, Qt.ItemDataRole.UserRole, entry.path)
+                item.setToolTip(0, entry.path)
+                self.tree.addTopLevelItem(item)
+            added += len(entries)
+        self._update_status()
+        return added, ignored
+
+    def remove_selected(self):
+        for item in self.tree.selectedItems():
+            self.queue.remove(item.data(0, Qt.ItemDataRole.UserRole))
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+        self._update_status()
+
+    def clear(self):
+        self.queue.clear()
+        self.tree.clear()
+        self._update_status()
+
+    def _toggle_direction(self, item, column):
+        file_path = item.data(0, Qt.ItemDataRole.UserRole)
+        direction = jobqueue.AEI2AEI if item.text(1) == jobqueue.AEI2PNG else jobqueue.AEI2PNG
+        if jobqueue.infer_direction(file_path, direction) != direction:
+            return
+        self.queue.set_direction(file_path, direction)
+        item.setText(1, direction)
+        self._update_status()
+
+    def _on_current_item_changed(self, current, previous):
+        if current is not None:
+            self.file_selected.emit(current.data(0, Qt.ItemDataRole.UserRole))
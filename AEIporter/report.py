@@ -0,0 +1,111 @@
+'''
+Per-stage instrumentation and run reports.
+
+The conversion core times every file in the stages `read` (file to memory),
+`decode` (PNG or AEI to pixels), `preprocess` (optional pixel preparation
+of PNG>AEI), `compress` (AEPi encode), `encode` (PIL
+encode) and `write` (memory to file), or in `copy` (file to file, for AEIs
+already in the target format). The timings travel with the
+`ConversionResult`s, and this module turns a batch of them into a JSON or
+CSV report and a plain-text summary.
+'''
+import csv
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from os import path
+from time import perf_counter
+
+STAGES = ["read", "decode", "preprocess", "compress", "encode", "write", "copy"]
+CSV_FIELDS = ["src", "dest", "status", "format", "error_type", "error", "bytes_in", "bytes_out", "total_s"] + [f"{stage}_s" for stage in STAGES]
+
+
+class StageTimer(object):
+    '''
+    Accumulates wall time per stage, `with timer("decode"): ...`.
+    '''
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+def total_time(result):
+    return sum((result.timings or {}).values())
+
+
+def result_to_dict(result):
+    data = OrderedDict((field, getattr(result, field)) for field in ["src", "dest", "status", "format", "error_type", "error", "bytes_in", "bytes_out"])
+    data["total_s"] = total_time(result)
+    data["timings"] = dict(result.timings or {})
+    return data
+
+
+def write_json(results, file_path):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump({"results": [result_to_dict(result) for result in results]}, f, indent=1)
+
+
+def write_csv(results, file_path):
+    with open(file_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for result in results:
+            row = result_to_dict(result)
+            timings = row.pop("timings")
+            row.update((f"{stage}_s", timings.get(stage, "")) for stage in STAGES)
+            writer.writerow(row)
+
+
+def write_report(results, file_path):
+    '''
+    JSON or CSV, picked by the extension of `file_path`.
+    '''
+    if file_path.lower().endswith(".csv"):
+        write_csv(results, file_path)
+    else:
+        write_json(results, file_path)
+
+
+def stages_text(timings):
+    return " ".join(f"{stage} {timings[stage]:.3f}" for stage in STAGES if stage in timings)
+
+
+def summary(results, slowest=10):
+    '''
+    Plain-text table of the slowest files and of throughput per output format.
+    Throughput divides by the summed per-file time, i.e. per worker.
+    '''
+    from .core import SKIPPED
+
+    results = [result for result in results if result.status != SKIPPED]
+    timed = [result for result in results if result.timings]
+    if not timed:
+        return "Nothing was timed."
+
+    lines = [f"Slowest {min(slowest, len(timed))} file(s):"]
+    for result in sorted(timed, key=total_time, reverse=True)[:slowest]:
+        lines.append(f"  {total_time(result):8.3f}s  {path.basename(result.src):<40} {stages_text(result.timings)}")
+
+    per_format = OrderedDict()
+    for result in results:
+        per_format.setdefault(result.format or "?", []).append(result)
+    lines.append("Throughput per format:")
+    lines.append(f"  {'format':<24} {'files':>6} {'seconds':>9} {'files/s':>8} {'MB/s in':>8} {'failed':>6}")
+    for compression_format, format_results in sorted(per_format.items()):
+        seconds = sum(total_time(result) for result in format_results)
+        bytes_in = sum(result.bytes_in for result in format_results)
+        failed = sum(1 for result in format_results if result.error_type)
+        files_per_s = len(format_results) / seconds if seconds else 0
+        mb_per_s = bytes_in / seconds / 1e6 if seconds else 0
+        lines.append(f"  {compression_format:<24} {len(format_results):>6} {seconds:>9.3f} {files_per_s:>8.2f} {mb_per_s:>8.2f} {failed:>6}")
+    return "\n".join(lines)
@@ -0,0 +1,192 @@
+'''
+Downscaled previews of AEI and PNG files.
+
+Thumbnails are kept in a memory-bounded LRU cache and, optionally, as small
+PNGs in a size-capped disk cache folder, both keyed by a hash of the file
+path together with its size and mtime. An unchanged file is thus never decoded twice, not
+even across sessions, and an edited one is decoded again on the next request.
+'''
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from os import path
+
+THUMBNAIL_SIZE = 128
+PREVIEW_SIZE = 512
+DEFAULT_MEMORY_BUDGET = 64 << 20
+DEFAULT_DISK_BUDGET = 256 << 20
+# a full disk cache is trimmed to this share of its budget, so that it is not
+# scanned again on every write
+DISK_TRIM_RATIO = 0.8
+
+
+def default_disk_cache_folder():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or path.join(path.expanduser("~"), ".cache")
+    return path.join(cache_home, "aeiporter", "thumbnails")
+
+
+def decode_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    '''
+    RGBA image of `file_path` (AEI or anything Pillow opens) fitting in `size`x`size`.
+    '''
+    from PIL import Image
+    from AEPi import AEI
+    if file_path.lower().endswith(".aei"):
+        with AEI.read(file_path) as aei:
+            image = aei._image.copy()
+    else:
+        with Image.open(file_path) as im:
+            # lets JPEG-like decoders skip straight to a smaller scale
+            im.draft("RGBA", (size, size))
+            image = im.convert("RGBA")
+    image.thumbnail((size, size), Image.Resampling.BILINEAR)
+    return image
+
+
+class ThumbnailCache(object):
+    '''
+    Thread-safe LRU of decoded thumbnails holding at most `memory_budget`
+    bytes of RGBA pixels, backed by `disk_folder` when given. The disk cache
+    is kept under `disk_budget` bytes, the least recently used files go first.
+    '''
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, disk_folder=None, disk_budget=DEFAULT_DISK_BUDGET):
+        self.memory_budget = memory_budget
+        self.disk_folder = disk_folder
+        self.disk_budget = disk_budget
+        self.memory_used = 0
+        # bytes in `disk_folder`, counted on the first write
+        self.disk_used = None
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path, size=THUMBNAIL_SIZE):
+        '''
+        Cache key of the current state of `file_path`, None if it can not be stat'ed.
+        '''
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        identity = f"{path.abspath(file_path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0{size}"
+        return hashlib.sha1(identity.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def _disk_path(self, key):
+        return path.join(self.disk_folder, key[:2], f"{key}.png")
+
+    def _remember(self, key, image):
+        # caller holds the lock
+        if key in self._images:
+            self._images.move_to_end(key)
+            return
+        self._images[key] = image
+        self.memory_used += image.width * image.height * 4
+        while self.memory_used > self.memory_budget and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self.memory_used -= evicted.width * evicted.height * 4
+
+    def cached(self, file_path, size=THUMBNAIL_SIZE):
+        '''
+        Thumbnail from memory only, None on a miss. Cheap enough for the GUI thread.
+        '''
+        key = self.key(file_path, size)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def load(self, file_path, size=THUMBNAIL_SIZE):
+        '''
+        Thumbnail from memory, then from disk, decoding `file_path` on a full
+        miss. Raises whatever decoding raises.
+        '''
+        key = self.key(file_path, size)
+        if key is None:
+            raise FileNotFoundError(file_path)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+
+        image = None
+        if self.disk_folder:
+            from PIL import Image
+            disk_path = self._disk_path(key)
+            try:
+                with Image.open(disk_path) as im:
+                    image = im.convert("RGBA")
+                # the trim goes by mtime, a hit keeps the file
+                os.utime(disk_path)
+            except (OSError, ValueError):
+                pass
+        if image is None:
+            image = decode_thumbnail(file_path, size)
+            if self.disk_folder:
+                self._store(key, image)
+
+        with self._lock:
+            self._remember(key, image)
+        return image
+
+    def _store(self, key, image):
+        disk_path = self._disk_path(key)
+        try:
+            os.makedirs(path.dirname(disk_path), exist_ok=True)
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=1)
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_path, disk_path)
+        except OSError:
+            # the disk cache is only an optimisation
+            return
+        with self._disk_lock:
+            if self.disk_used is None:
+                self.disk_used = sum(size for _, size, _ in self._disk_files())
+            else:
+                self.disk_used += buffer.tell()
+            if self.disk_used > self.disk_budget:
+                self._trim_disk(self.disk_budget * DISK_TRIM_RATIO)
+
+    def _disk_files(self):
+        '''
+        (mtime, size, path) of every thumbnail in the disk cache.
+        '''
+        files = []
+        try:
+            subfolders = list(os.scandir(self.disk_folder))
+        except OSError:
+            return files
+        for subfolder in subfolders:
+            try:
+                for entry in os.scandir(subfolder.path):
+                    if entry.name.endswith(".png") and entry.is_file():
+                        stat = entry.stat()
+                        files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            except OSError:
+                pass
+        return files
+
+    def _trim_disk(self, target):
+        # caller holds the disk lock
+        files = sorted(self._disk_files())
+        self.disk_used = sum(size for _, size, _ in files)
+        for _, size, file_path in files:
+            if self.disk_used <= target:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                continue
+            self.disk_used -= size
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.memory_used = 0
@@ -0,0 +1,98 @@
+'''
+Streaming recursive directory walker with regex and glob filters.
+
+Files are yielded as soon as their directory has been read, so conversions
+can start while the rest of a large tree is still being listed.
+'''
+import fnmatch
+import os
+import re
+from os import path
+
+
+def _compile(patterns):
+    return [re.compile(pattern) for pattern in patterns or []]
+
+
+def _relative(file_path, src_folder_path):
+    return path.relpath(file_path, src_folder_path).replace(os.sep, "/")
+
+
+class PathFilter(object):
+    '''
+    Matches paths relative to the walked folder, with `/` as separator.
+    Regexes are searched anywhere in the path, globs have to match the whole
+    relative path or the bare file name. With no include pattern every path
+    is included; excludes win over includes.
+    '''
+    def __init__(self, include=None, exclude=None, include_globs=None, exclude_globs=None):
+        self.include = _compile(include)
+        self.exclude = _compile(exclude)
+        self.include_globs = list(include_globs or [])
+        self.exclude_globs = list(exclude_globs or [])
+
+    @staticmethod
+    def _glob_match(relative_path, globs):
+        name = relative_path.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatchcase(relative_path, glob) or fnmatch.fnmatchcase(name, glob) for glob in globs)
+
+    def excluded(self, relative_path):
+        return any(regex.search(relative_path) for regex in self.exclude) \
+            or self._glob_match(relative_path, self.exclude_globs)
+
+    def __call__(self, relative_path):
+        if self.excluded(relative_path):
+            return False
+        if not self.include and not self.include_globs:
+            return True
+        return any(regex.search(relative_path) for regex in self.include) \
+            or self._glob_match(relative_path, self.include_globs)
+
+
+def walk(src_folder_path, extensions=None, recursive=True, path_filter=None):
+    '''
+    Yield the files under `src_folder_path` ending with one of `extensions`
+    (case-insensitive, all files when None) and accepted by `path_filter`.
+
+    Every directory is read with a single `os.scandir`; its files come in
+    name order before its subdirectories are descended into. Directories
+    matching an exclude pattern (tested as `<relative path>/`) are pruned.
+    '''
+    if isinstance(extensions, str):
+        extensions = (extensions,)
+    extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+
+    stack = [src_folder_path]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not (path_filter and path_filter.excluded(_relative(entry.path, src_folder_path) + "/")):
+                        sub_dirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if extensions and not entry.name.lower().endswith(extensions):
+                continue
+            if path_filter and not path_filter(_relative(entry.path, src_folder_path)):
+                continue
+            yield entry.path
+        stack.extend(reversed(sub_dirs))
+
+
+def mirrored_dest_folder(file_path, src_folder_path, dest_folder_path):
+    '''
+    Folder in `dest_folder_path` at the same relative place as `file_path` is in `src_folder_path`.
+    '''
+    relative_dir = path.relpath(path.dirname(file_path), src_folder_path)
+    return path.normpath(path.join(dest_folder_path, relative_dir))
@@ -0,0 +1,308 @@
+'''
+Watch mode: convert AEIs and PNGs of a source tree again as they are saved.
+
+On Linux the tree is watched with inotify through ctypes; elsewhere, or when
+inotify runs out of watches, it is polled. Editors tend to save in bursts
+(a temporary file, a rename, several writes), so changes are collected until
+the tree has been quiet for a short debounce before they are converted.
+'''
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from os import path
+
+from . import core, batch, walker
+
+# seconds without further changes before a burst is converted
+DEBOUNCE = 0.25
+# seconds between two scans of the polling fallback
+POLL_INTERVAL = 0.3
+# longest wait for events, so that cancelling is noticed
+IDLE_TIMEOUT = 0.2
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# files count once written and closed or moved in, new folders are watched too
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+# struct inotify_event without its trailing name
+EVENT = struct.Struct("iIII")
+
+
+@lru_cache(maxsize=None)
+def _inotify_libc():
+    '''
+    libc with the inotify calls bound, None where there is no inotify.
+    '''
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class _Watcher(ABC):
+    '''
+    Base of the watchers: which files of the tree count, the same way
+    `walker.walk` picks them.
+    '''
+    method = None
+
+    def __init__(self, src_folder_path, extensions=None, recursive=True, path_filter=None):
+        if isinstance(extensions, str):
+            extensions = (extensions,)
+        self.src_folder_path = path.abspath(src_folder_path)
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.recursive = recursive
+        self.path_filter = path_filter
+
+    def accepts(self, file_path):
+        if self.extensions and not file_path.lower().endswith(self.extensions):
+            return False
+        relative_path = walker._relative(file_path, self.src_folder_path)
+        if not self.recursive and "/" in relative_path:
+            return False
+        return self.path_filter is None or self.path_filter(relative_path)
+
+    def files(self, folder_path=None):
+        '''
+        Every file of the tree, or of its subfolder `folder_path`, that counts.
+        '''
+        for file_path in walker.walk(folder_path or self.src_folder_path, self.extensions, recursive=self.recursive):
+            if self.accepts(file_path):
+                yield file_path
+
+    @abstractmethod
+    def read(self, timeout):
+        '''
+        Files changed since the last call, waiting up to `timeout` seconds for one.
+        '''
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class InotifyWatcher(_Watcher):
+    '''
+    Watches every folder of the tree with inotify. Raises OSError when
+    inotify is missing or the tree needs more watches than the system allows.
+    '''
+    method = "inotify"
+
+    def __init__(self, src_folder_path, extensions=None, recursive=True, path_filter=None):
+        super().__init__(src_folder_path, extensions, recursive, path_filter)
+        self._libc = _inotify_libc()
+        if self._libc is None:
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        # watch descriptor -> folder
+        self._folders = {}
+        try:
+            self._add_tree(self.src_folder_path)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, folder_path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder_path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # a subfolder may be gone again already, running out of watches is fatal
+            if folder_path == self.src_folder_path or error not in (errno.ENOENT, errno.ENOTDIR):
+                raise OSError(error, os.strerror(error), folder_path)
+            return
+        self._folders[wd] = folder_path
+
+    def _add_tree(self, folder_path):
+        stack = [folder_path]
+        while stack:
+            folder_path = stack.pop()
+            self._add_watch(folder_path)
+            if not self.recursive:
+                continue
+            try:
+                with os.scandir(folder_path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and not self._excluded(entry.path):
+                            stack.append(entry.path)
+            except OSError:
+                pass
+
+    def _excluded(self, folder_path):
+        return self.path_filter is not None and self.path_filter.excluded(walker._relative(folder_path, self.src_folder_path) + "/")
+
+    def read(self, timeout):
+        if self._fd < 0 or not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + EVENT.size <= len(buffer):
+            wd, mask, _, name_length = EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + EVENT.size:offset + EVENT.size + name_length].rstrip(b"\0")
+            offset += EVENT.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, anything may have changed
+                changed.update(self.files())
+                continue
+            if mask & IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+            folder_path = self._folders.get(wd)
+            if folder_path is None or not name:
+                continue
+            file_path = path.join(folder_path, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                # a new or moved in folder, its files may be written before its watch is added
+                if self.recursive and not self._excluded(file_path):
+                    self._add_tree(file_path)
+                    changed.update(self.files(file_path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self.accepts(file_path):
+                changed.add(file_path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(_Watcher):
+    '''
+    Rescans the tree every `interval` seconds. A file is reported once its
+    size and modification time held still over one scan, so files still
+    being written are not picked up half way.
+    '''
+    method = "polling"
+
+    def __init__(self, src_folder_path, extensions=None, recursive=True, path_filter=None, interval=POLL_INTERVAL):
+        super().__init__(src_folder_path, extensions, recursive, path_filter)
+        self.interval = interval
+        self._reported = self._scan()
+        # changed files waiting to hold still, with their state of the last scan
+        self._settling = {}
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        states = {}
+        for file_path in self.files():
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            states[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return states
+
+    def read(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_scan = time.monotonic() + self.interval
+
+        states = self._scan()
+        changed = {file_path for file_path, state in states.items() if self._reported.get(file_path) != state}
+        settled = {file_path for file_path in changed if self._settling.get(file_path) == states[file_path]}
+        self._settling = {file_path: states[file_path] for file_path in changed - settled}
+        for file_path in settled:
+            self._reported[file_path] = states[file_path]
+        for file_path in self._reported.keys() - states.keys():
+            del self._reported[file_path]
+        return settled
+
+
+def open_watcher(src_folder_path, extensions=None, recursive=True, path_filter=None, polling=False):
+    '''
+    Watcher of the tree, with inotify unless `polling` is set or it can not
+    be used. Its `method` tells which one it is.
+    '''
+    if not polling:
+        try:
+            return InotifyWatcher(src_folder_path, extensions, recursive, path_filter)
+        except OSError:
+            pass
+    return PollingWatcher(src_folder_path, extensions, recursive, path_filter)
+
+
+def bursts(folder_watcher, cancelled=None, debounce=DEBOUNCE, ignored=None):
+    '''
+    Yield sorted lists of the files `folder_watcher` saw change, each once
+    no further change came for `debounce` seconds. Files in `ignored` and
+    files deleted again meanwhile are left out. Runs until `cancelled`
+    returns True.
+    '''
+    changed = set()
+    last_change = 0
+    while cancelled is None or not cancelled():
+        timeout = max(0, last_change + debounce - time.monotonic()) if changed else IDLE_TIMEOUT
+        new = folder_watcher.read(min(timeout, IDLE_TIMEOUT))
+        if ignored:
+            new -= ignored
+        if new:
+            changed |= new
+            last_change = time.monotonic()
+        elif changed and time.monotonic() - last_change >= debounce:
+            settled = [file_path for file_path in sorted(changed) if path.isfile(file_path)]
+            changed = set()
+            if settled:
+                yield settled
+
+
+def iter_watch(func, folder_watcher, dest_folder_path, jobs=None, cancelled=None, incremental=False, memory_budget=None,
+               debounce=DEBOUNCE, ignored=None, **kwargs):
+    '''
+    Convert the files `folder_watcher` reports changed with
+    `func(src, dest_folder_path=..., overwrite=True, **kwargs)`, the
+    converters of `core` named and laid out as in a folder batch, subfolders
+    mirrored in `dest_folder_path`. Yields their `ConversionResult`s until
+    `cancelled` returns True; outputs of deleted sources are left alone.
+
+    Outputs written into the watched tree itself are not converted again:
+    those of the watch and those in `ignored`, the absolute paths of outputs
+    written before, such as by the first run. `ignored` is extended with
+    every output of the watch, so its owner can keep adding to it as well.
+    '''
+    kwargs["overwrite"] = True
+    runner = batch.iter_incremental if incremental else batch.iter_batch
+    written = ignored if ignored is not None else set()
+    for changed in bursts(folder_watcher, cancelled, debounce, written):
+        sources = [batch.Job(file_path, walker.mirrored_dest_folder(file_path, folder_watcher.src_folder_path, dest_folder_path))
+                   for file_path in changed]
+        # a single saved file is converted in-process, without starting a pool
+        for result in runner(func, sources, jobs=min(jobs or batch.default_jobs(), len(sources)), cancelled=cancelled,
+                             memory_budget=memory_budget, dest_folder_path=dest_folder_path, **kwargs):
+            if result.status == core.CONVERTED and result.dest:
+                written.add(path.abspath(result.dest))
+            yield result
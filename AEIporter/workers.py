@@ -0,0 +1,152 @@
+'''
+Qt side of the batch engine: runs a batch off the GUI thread and reports
+back through signals.
+'''
+import queue
+import threading
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from . import batch, header, watcher
+
+_END = object()
+
+
+class WorkerSignals(QObject):
+    # files done, files total, ConversionResult of the file just finished
+    progress = pyqtSignal(int, int, object)
+    # BatchResult, whether the batch was cancelled
+    finished = pyqtSignal(object, bool)
+    error = pyqtSignal(str)
+
+
+class ConversionWorker(QRunnable):
+    '''
+    Runs `batch.iter_batch(func, sources, jobs, memory_budget, **kwargs)` (or
+    `batch.iter_incremental` with `incremental` on) on a QThreadPool thread.
+    `cancel` stops the batch between files. A lazy `sources` is walked
+    ahead on a thread of its own, the total that progress reports grows
+    with every file found.
+    '''
+    def __init__(self, func, sources, jobs=None, incremental=False, memory_budget=None, **kwargs):
+        super().__init__()
+        self.func = func
+        self.sources = sources
+        self.jobs = jobs
+        self.incremental = incremental
+        self.memory_budget = memory_budget
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancel_event = threading.Event()
+        # outputs of the sources known so far
+        self.total = 0
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def _walk(self, walked):
+        try:
+            for source in self.sources:
+                if self._cancel_event.is_set():
+                    break
+                self.total += batch.count_outputs(self.func, [source], **self.kwargs)
+                walked.put(source)
+        except Exception as e:
+            walked.put(e)
+        walked.put(_END)
+
+    def _walked_sources(self):
+        '''
+        `sources` as `_walk` finds them, it does not wait for the conversions.
+        '''
+        walked = queue.Queue()
+        threading.Thread(target=self._walk, args=(walked,), name="aeiporter-walker", daemon=True).start()
+        while True:
+            source = walked.get()
+            if source is _END:
+                return
+            if isinstance(source, Exception):
+                raise source
+            yield source
+
+    def run(self):
+        results = []
+        if isinstance(self.sources, list):
+            self.total = batch.count_outputs(self.func, self.sources, **self.kwargs)
+            sources = self.sources
+        else:
+            sources = self._walked_sources()
+        runner = batch.iter_incremental if self.incremental else batch.iter_batch
+        try:
+            for result in runner(self.func, sources, jobs=self.jobs, cancelled=self._cancel_event.is_set,
+                              memory_budget=self.memory_budget, **self.kwargs):
+                results.append(result)
+                self.signals.progress.emit(len(results), max(self.total, len(results)), result)
+        except Exception as e:
+            self.signals.error.emit(f"Batch aborted with {type(e).__name__}: '{e}'")
+        self.signals.finished.emit(batch.BatchResult(results), self._cancel_event.is_set())
+
+
+class WatchSignals(QObject):
+    # how the folder is watched, "inotify" or "polling"
+    started = pyqtSignal(str)
+    # ConversionResult of a file converted after it was saved
+    converted = pyqtSignal(object)
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
+
+
+class WatchWorker(QRunnable):
+    '''
+    Watches `src_folder_path` and converts the files with extension `ext`
+    saved in it through `watcher.iter_watch` on a QThreadPool thread, until
+    `cancel`. Paths in the `ignored` set are outputs, not saved sources.
+    '''
+    def __init__(self, func, src_folder_path, ext, dest_folder_path, recursive=False, path_filter=None, jobs=None, incremental=False,
+                 memory_budget=None, ignored=None, **kwargs):
+        super().__init__()
+        self.func = func
+        self.src_folder_path = src_folder_path
+        self.ext = ext
+        self.dest_folder_path = dest_folder_path
+        self.recursive = recursive
+        self.path_filter = path_filter
+        self.jobs = jobs
+        self.incremental = incremental
+        self.memory_budget = memory_budget
+        self.ignored = ignored
+        self.kwargs = kwargs
+        self.signals = WatchSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            with watcher.open_watcher(self.src_folder_path, self.ext, self.recursive, self.path_filter) as folder_watcher:
+                self.signals.started.emit(folder_watcher.method)
+                for result in watcher.iter_watch(self.func, folder_watcher, self.dest_folder_path, jobs=self.jobs,
+                                                 cancelled=self._cancel_event.is_set, incremental=self.incremental,
+                                                 memory_budget=self.memory_budget, ignored=self.ignored, **self.kwargs):
+                    self.signals.converted.emit(result)
+        except Exception as e:
+            self.signals.error.emit(f"Watching stopped with {type(e).__name__}: '{e}'")
+        self.signals.finished.emit()
+
+
+class ScanSignals(QObject):
+    # list of header.ScanEntry
+    finished = pyqtSignal(object)
+
+
+class ScanWorker(QRunnable):
+    '''
+    Runs `header.scan_folder` on a QThreadPool thread.
+    '''
+    def __init__(self, src_folder_path):
+        super().__init__()
+        self.src_folder_path = src_folder_path
+        self.signals = ScanSignals()
+
+    def run(self):
+        self.signals.finished.emit(header.scan_folder(self.src_folder_path))
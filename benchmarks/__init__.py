@@ -0,0 +1,3 @@
+'''
+Throughput benchmarks for AEIporter, see README.md. Not part of the installed package.
+'''
@@ -0,0 +1,355 @@
+'''
+Conversion throughput benchmark.
+
+    python -m benchmarks.bench run --corpus CORPUS_DIR [--generate] [-o results.json]
+    python -m benchmarks.bench startup [-o startup.json]
+    python -m benchmarks.bench compare OLD.json NEW.json [--threshold 0.1]
+
+Every (mode, direction, format) case runs in a fresh interpreter so that its
+peak RSS is its own. Modes:
+
+- `single`: the core conversion called file by file in-process
+- `folder`: the folder conversions of `batch` with one job, walking the
+  corpus folder the way the CLI and GUI do
+- `parallel`: `batch.run_batch` with `--jobs` processes
+- `pipeline`: the same through the staged, memory-bounded `pipeline.iter_pipeline`
+
+aei2png runs once per export profile of `--profiles`, reporting the output
+size (`bytes_out`) next to the time of each.
+
+Stage timings (read, decode, compress, encode, write) come from the
+`ConversionResult`s and are summed over all files of a case.
+
+`startup` times the cold start of the ways the tool is launched from
+scripts (`STARTUP_CASES`), each in a fresh interpreter, with the
+`-X importtime` breakdown of one extra run: total import time, the slowest
+modules and which of the heavy packages got imported at all.
+'''
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+import PIL
+
+from AEIporter import __version__, core, batch, report, pipeline
+from AEIporter.manifest import aepi_version
+from . import corpus
+
+MODES = ["single", "folder", "parallel", "pipeline"]
+DIRECTIONS = ["png2aei", "aei2png", "aei2aei"]
+# interpreter arguments of the cold starts measured by `startup`
+STARTUP_CASES = {
+    "import": ["-c", "import AEIporter"],
+    "library": ["-c", "import AEIporter.batch"],
+    "cli": ["-m", "AEIporter", "--version"],
+    "gui": ["-c", "import AEIporter.AEIporter"],
+}
+HEAVY_MODULES = ["PIL", "AEPi", "numpy", "PyQt6"]
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+def convert_one(source, direction, dest_folder_path, compression_format, profile=core.DEFAULT_EXPORT_PROFILE):
+    if direction == "aei2png":
+        return core.convert_to_png(source, dest_folder_path, overwrite=True, profile=profile)
+    return core.convert_to_aei(source, dest_folder_path, compression_format, overwrite=True,
+                               is_aei_to_aei=direction == "aei2aei")
+
+
+def peak_rss_kb():
+    '''
+    Peak resident set of this process in kilobytes. Linux carries ru_maxrss
+    over from the parent across fork and exec, so a case started by a `run`
+    that generated the corpus would report the parent's peak; VmHWM starts
+    afresh with exec.
+    '''
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    # kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _folder_size(folder_path):
+    return sum(entry.stat().st_size for entry in os.scandir(folder_path) if entry.is_file())
+
+
+def run_case(corpus_path, mode, direction, compression_format, target_format, jobs, repeat, profile=core.DEFAULT_EXPORT_PROFILE):
+    '''
+    Run one case in this process and return its measurements.
+    '''
+    description = corpus.load_corpus(corpus_path)
+    sources = description["png"] if direction == "png2aei" else description["aei"][compression_format]
+    output_format = target_format if direction == "aei2aei" else compression_format
+    bytes_in = sum(path.getsize(source) for source in sources)
+
+    best = None
+    for _ in range(repeat):
+        dest_folder_path = tempfile.mkdtemp(prefix="aeiporter-bench-")
+        try:
+            start = time.perf_counter()
+            if mode == "single":
+                results = [convert_one(source, direction, dest_folder_path, output_format, profile) for source in sources]
+            elif mode == "folder":
+                # every corpus folder holds only the sources of this case
+                src_folder_path = path.dirname(sources[0])
+                if direction == "aei2png":
+                    results = batch.convert_folder_to_png(src_folder_path, dest_folder_path, overwrite=True, jobs=1, profile=profile).results
+                else:
+                    results = batch.convert_folder_to_aei(src_folder_path, dest_folder_path, output_format, overwrite=True,
+                                                          is_aei_to_aei=direction == "aei2aei", jobs=1).results
+            elif mode == "pipeline":
+                func = core.convert_to_png if direction == "aei2png" else core.convert_to_aei
+                kwargs = {"profile": profile} if direction == "aei2png" else {"compression_format": output_format, "is_aei_to_aei": direction == "aei2aei"}
+                results = batch.run_batch(func, sources, jobs=jobs, memory_budget=pipeline.default_memory_budget(),
+                                          dest_folder_path=dest_folder_path, overwrite=True, **kwargs).results
+            else:
+                results = batch.run_batch(convert_one, sources, jobs=jobs, direction=direction,
+                                          dest_folder_path=dest_folder_path, compression_format=output_format, profile=profile).results
+            wall = time.perf_counter() - start
+            bytes_out = _folder_size(dest_folder_path)
+        finally:
+            shutil.rmtree(dest_folder_path, ignore_errors=True)
+        if best is None or wall < best["wall_s"]:
+            best = {
+                "wall_s": wall,
+                "bytes_out": bytes_out,
+                "failed": sum(1 for result in results if result.status == core.FAILED),
+                # summed over files, so in parallel mode this is CPU time across workers
+                "stages": {stage: sum((result.timings or {}).get(stage, 0.0) for result in results)
+                           for stage in report.STAGES if any(stage in (result.timings or {}) for result in results)},
+            }
+
+    return dict(best, **{
+        "mode": mode,
+        "direction": direction,
+        "format": compression_format,
+        "target_format": target_format if direction == "aei2aei" else None,
+        "profile": profile if direction == "aei2png" else None,
+        "jobs": jobs if mode in ("parallel", "pipeline") else 1,
+        "files": len(sources),
+        "bytes_in": bytes_in,
+        "files_per_s": len(sources) / best["wall_s"] if best["wall_s"] else None,
+        "mb_per_s": bytes_in / best["wall_s"] / 1e6 if best["wall_s"] else None,
+        "peak_rss_kb": peak_rss_kb(),
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        "peak_child_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    })
+
+
+def case_key(result):
+    key = f"{result['mode']}/{result['direction']}/{result['format']}"
+    # reports from before export profiles only have the default one
+    if result.get("profile") not in (None, core.DEFAULT_EXPORT_PROFILE):
+        key += f"/{result['profile']}"
+    return key
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=path.dirname(path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "aeiporter": __version__,
+        "commit": commit,
+        "aepi": aepi_version(),
+        "pillow": PIL.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run(args):
+    if args.generate or not path.exists(path.join(args.corpus, corpus.CORPUS_FILE_NAME)):
+        corpus.generate_corpus(args.corpus, scale=args.scale, formats=args.formats)
+    description = corpus.load_corpus(args.corpus)
+    formats = args.formats or list(description["aei"])
+    jobs = args.jobs or batch.default_jobs()
+
+    results = []
+    for mode in args.modes:
+        for direction in args.directions:
+            for compression_format in formats:
+                target_format = args.target_format or next((f for f in formats if f != compression_format), compression_format)
+                for profile in args.profiles if direction == "aei2png" else [core.DEFAULT_EXPORT_PROFILE]:
+                    command = [sys.executable, "-m", "benchmarks.bench", "_case", args.corpus, mode, direction,
+                               compression_format, target_format, str(jobs), str(args.repeat), profile]
+                    completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+                    if completed.returncode != 0:
+                        print(f"{mode}/{direction}/{compression_format}/{profile} failed:\n{completed.stderr}", file=sys.stderr)
+                        continue
+                    result = json.loads(completed.stdout.splitlines()[-1])
+                    results.append(result)
+                    peak_kb = max(result["peak_rss_kb"], result["peak_child_rss_kb"])
+                    print(f"{case_key(result):<40} {result['files_per_s']:8.2f} files/s {result['mb_per_s']:8.2f} MB/s "
+                          f"{peak_kb / 1024:8.1f} MB peak {result['bytes_out'] / 1e6:8.2f} MB out", file=sys.stderr)
+
+    report = {"meta": metadata(), "corpus": {"path": path.abspath(args.corpus), "scale": description["scale"],
+                                             "seed": description["seed"]}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+    return 0
+
+
+def parse_importtime(stderr):
+    '''
+    (module, self µs, cumulative µs, nesting depth) of every line of
+    `-X importtime` output, in the order Python printed them.
+    '''
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|", 2)
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return modules
+
+
+def run_startup_case(name, repeat):
+    '''
+    Measurements of the cold start `STARTUP_CASES[name]`, None if it failed.
+    '''
+    command = [sys.executable] + STARTUP_CASES[name]
+    wall = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            print(f"startup/{name} failed:\n{completed.stderr}", file=sys.stderr)
+            return None
+        wall = elapsed if wall is None else min(wall, elapsed)
+
+    # -X importtime slows the imports down itself, so it gets a run of its own
+    completed = subprocess.run([sys.executable, "-X", "importtime"] + STARTUP_CASES[name], capture_output=True, text=True, cwd=ROOT)
+    modules = parse_importtime(completed.stderr)
+    imported = {module for module, _, _, _ in modules}
+    return {
+        "case": name,
+        "command": " ".join(["python"] + STARTUP_CASES[name]),
+        "wall_ms": wall * 1000,
+        "import_ms": sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1000,
+        "heavy": [module for module in HEAVY_MODULES if module in imported],
+        "slowest": [{"module": module, "self_ms": self_us / 1000, "cumulative_ms": cumulative / 1000}
+                    for module, self_us, cumulative, _ in sorted(modules, key=lambda m: -m[1])[:8]],
+    }
+
+
+def startup(args):
+    cases = []
+    for name in args.cases:
+        result = run_startup_case(name, args.repeat)
+        if result is None:
+            continue
+        cases.append(result)
+        print(f"{'startup/' + name:<40} {result['wall_ms']:8.1f} ms wall {result['import_ms']:8.1f} ms imports  "
+              f"{', '.join(result['heavy']) or '-'}", file=sys.stderr)
+
+    report = {"meta": metadata(), "startup": cases}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+    return 0
+
+
+def compare(args):
+    '''
+    Print the files/s change of every case present in both reports, and the
+    wall time change of their `startup` cases; return 1 if any case slowed
+    down by more than `threshold`.
+    '''
+    with open(args.old, "r", encoding="utf-8") as f:
+        old_report = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new_report = json.load(f)
+    old = {case_key(result): result for result in old_report.get("results", [])}
+    new = {case_key(result): result for result in new_report.get("results", [])}
+
+    regressed = False
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]["files_per_s"], new[key]["files_per_s"]
+        if not before or not after:
+            continue
+        change = after / before - 1
+        marker = ""
+        if change < -args.threshold:
+            marker = "  REGRESSION"
+            regressed = True
+        print(f"{key:<40} {before:8.2f} -> {after:8.2f} files/s ({change:+.1%}){marker}")
+
+    old = {result["case"]: result for result in old_report.get("startup", [])}
+    new = {result["case"]: result for result in new_report.get("startup", [])}
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]["wall_ms"], new[key]["wall_ms"]
+        change = after / before - 1
+        marker = ""
+        if change > args.threshold:
+            marker = "  REGRESSION"
+            regressed = True
+        print(f"{'startup/' + key:<40} {before:8.1f} -> {after:8.1f} ms ({change:+.1%}){marker}")
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_case":
+        corpus_path, mode, direction, compression_format, target_format, jobs, repeat, profile = argv[1:9]
+        print(json.dumps(run_case(corpus_path, mode, direction, compression_format, target_format, int(jobs), int(repeat), profile)))
+        return 0
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description="AEIporter conversion benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sub = commands.add_parser("run", help="run the benchmark and write a JSON report")
+    sub.add_argument("--corpus", required=True, help="corpus folder, generated when missing")
+    sub.add_argument("--generate", action="store_true", help="regenerate the corpus first")
+    sub.add_argument("--scale", type=int, default=1, help="corpus images per size and alpha variant (default: 1)")
+    sub.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    sub.add_argument("--directions", nargs="+", choices=DIRECTIONS, default=DIRECTIONS)
+    sub.add_argument("--formats", nargs="+", help="compression formats (default: all in the corpus)")
+    sub.add_argument("--target-format", help="target of aei2aei (default: the next benchmarked format)")
+    sub.add_argument("--profiles", nargs="+", choices=list(core.EXPORT_PROFILES), default=list(core.EXPORT_PROFILES),
+                     help="export profiles of aei2png (default: all)")
+    sub.add_argument("-j", "--jobs", type=int, help="processes of the parallel mode (default: all cores)")
+    sub.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest is kept (default: 1)")
+    sub.add_argument("-o", "--output", help="report file (default: stdout)")
+
+    sub = commands.add_parser("startup", help="time cold starts and their imports")
+    sub.add_argument("--cases", nargs="+", choices=list(STARTUP_CASES), default=list(STARTUP_CASES))
+    sub.add_argument("--repeat", type=int, default=5, help="runs per case, the fastest is kept (default: 5)")
+    sub.add_argument("-o", "--output", help="report file (default: stdout)")
+
+    sub = commands.add_parser("compare", help="compare two reports")
+    sub.add_argument("old")
+    sub.add_argument("new")
+    sub.add_argument("--threshold", type=float, default=0.1, help="allowed files/s drop or startup time rise before failing (default: 0.1)")
+
+    args = parser.parse_args(argv)
+    return {"run": run, "startup": startup, "compare": compare}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
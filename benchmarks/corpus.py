@@ -0,0 +1,85 @@
+'''
+Reproducible synthetic corpus of PNGs and AEIs.
+
+    python -m benchmarks.corpus CORPUS_DIR [--scale N] [--seed S]
+
+Every image mixes smooth gradients with seeded noise so that both PNG and the
+block compressors get realistic work; half of the images carry alpha. The
+AEIs are made from the PNGs in every format `is_compression_supported` accepts.
+'''
+import argparse
+import json
+import os
+import random
+from os import path
+from PIL import Image
+
+from AEIporter import core
+
+SIZES = [(64, 64), (256, 256), (512, 1024), (2048, 2048)]
+CORPUS_FILE_NAME = "corpus.json"
+
+
+def synthetic_image(size, alpha, rng):
+    width, height = size
+    red = Image.linear_gradient("L").resize(size)
+    green = red.transpose(Image.Transpose.ROTATE_90).resize(size)
+    noise = Image.frombytes("L", size, rng.randbytes(width * height))
+    blue = Image.blend(red, noise, 0.5)
+    if alpha:
+        return Image.merge("RGBA", (red, green, blue, Image.radial_gradient("L").resize(size)))
+    return Image.merge("RGB", (red, green, blue))
+
+
+def generate_corpus(corpus_path, scale=1, seed=0, formats=None):
+    '''
+    Write the corpus under `corpus_path` and return its description, which is
+    also saved as `corpus.json`. `scale` is the number of images per size and
+    alpha variant.
+    '''
+    rng = random.Random(seed)
+    formats = formats or core.supported_format_names()
+    png_folder_path = path.join(corpus_path, "png")
+    os.makedirs(png_folder_path, exist_ok=True)
+
+    pngs = []
+    for width, height in SIZES:
+        for alpha in (True, False):
+            for i in range(scale):
+                name = f"{width}x{height}_{'rgba' if alpha else 'rgb'}_{i}.png"
+                png_file_path = path.join(png_folder_path, name)
+                with synthetic_image((width, height), alpha, rng) as im:
+                    im.save(png_file_path)
+                pngs.append(png_file_path)
+
+    aeis = {}
+    for compression_format in formats:
+        aei_folder_path = path.join(corpus_path, "aei", compression_format)
+        os.makedirs(aei_folder_path, exist_ok=True)
+        results = [core.convert_to_aei(png, aei_folder_path, compression_format, overwrite=True) for png in pngs]
+        aeis[compression_format] = [result.dest for result in results if result.status == core.CONVERTED]
+
+    description = {"seed": seed, "scale": scale, "sizes": SIZES, "png": pngs, "aei": aeis}
+    with open(path.join(corpus_path, CORPUS_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(description, f, indent=1)
+    return description
+
+
+def load_corpus(corpus_path):
+    with open(path.join(corpus_path, CORPUS_FILE_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus.")
+    parser.add_argument("corpus", help="folder to write the corpus to")
+    parser.add_argument("--scale", type=int, default=1, help="images per size and alpha variant (default: 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", nargs="*", help="compression formats of the AEIs (default: all supported)")
+    args = parser.parse_args(argv)
+    description = generate_corpus(args.corpus, scale=args.scale, seed=args.seed, formats=args.formats)
+    print(f"{len(description['png'])} PNGs, {sum(len(v) for v in description['aei'].values())} AEIs in {args.corpus}")
+
+
+if __name__ == "__main__":
+    main()
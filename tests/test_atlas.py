@@ -0,0 +1,28 @@
+'''
+Packing sprites into an atlas and exporting them back.
+'''
+from PIL import Image
+
+from AEIporter import atlas, core
+
+
+def test_pack_export_round_trip_keeps_translucent_pixels(tmp_path):
+    src_folder_path = tmp_path / "sprites"
+    src_folder_path.mkdir()
+    sprite = Image.new("RGBA", (8, 4), (200, 100, 50, 128))
+    sprite.putpixel((0, 0), (10, 20, 30, 64))
+    sprite.putpixel((1, 0), (0, 0, 0, 0))
+    sprite.save(src_folder_path / "a.png")
+    opaque = Image.new("RGBA", (4, 4), (1, 2, 3, 255))
+    opaque.save(src_folder_path / "b.png")
+
+    # uncompressed, so that the pixels come back exactly
+    packed = atlas.pack_folder_to_aei(str(src_folder_path), str(tmp_path), "Uncompressed_UI")
+    assert packed.status == core.CONVERTED, packed.error
+    exported = core.export_textures(packed.dest, str(tmp_path))
+    assert exported.status == core.CONVERTED, exported.error
+
+    for index, expected in enumerate([sprite, opaque]):
+        with Image.open(core.texture_file_path_for(packed.dest, str(tmp_path), index)) as texture:
+            assert texture.size == expected.size
+            assert texture.convert("RGBA").tobytes() == expected.tobytes()
@@ -0,0 +1,38 @@
+'''
+Up-to-date checks of the incremental manifest.
+'''
+import os
+
+from AEIporter import manifest
+
+
+def test_source_edited_after_the_check_is_stale(tmp_path):
+    src = tmp_path / "sprite.png"
+    src.write_bytes(b"before")
+    dest = tmp_path / "sprite.aei"
+    dest.write_bytes(b"aei")
+    dest = str(dest)
+    entries = manifest.Manifest(str(tmp_path))
+
+    state = entries.source_state(str(src))
+    entries.hash_source(str(src), state)
+    # edited while it was converting, the checked state is what gets recorded
+    src.write_bytes(b"after!")
+    os.utime(src, ns=(state["mtime_ns"] + 10**9, state["mtime_ns"] + 10**9))
+    entries.record(str(src), dest, "DXT5", state=state)
+
+    assert not entries.is_up_to_date(str(src), dest, "DXT5")
+
+
+def test_touched_source_is_up_to_date(tmp_path):
+    src = tmp_path / "sprite.png"
+    src.write_bytes(b"pixels")
+    dest = tmp_path / "sprite.aei"
+    dest.write_bytes(b"aei")
+    dest = str(dest)
+    entries = manifest.Manifest(str(tmp_path))
+    entries.record(str(src), dest, "DXT5")
+
+    stat = os.stat(src)
+    os.utime(src, ns=(stat.st_mtime_ns + 10**9, stat.st_mtime_ns + 10**9))
+    assert entries.is_up_to_date(str(src), dest, "DXT5")
@@ -0,0 +1,26 @@
+'''
+Mip levels of the PNG>AEI pre-processing.
+'''
+import pytest
+from PIL import Image
+
+from AEIporter import batch, core, preprocess
+
+
+def test_level_sizes_stop_before_unaligned_levels():
+    mips = preprocess.Preprocess(mips=True)
+    assert preprocess.level_sizes(96, 64, mips) == [(96, 64), (48, 32), (24, 16), (12, 8)]
+    assert preprocess.level_sizes(12, 20, mips) == [(12, 20)]
+    assert preprocess.level_sizes(100, 100, preprocess.Preprocess(pot="pad", mips=True))[-1] == (4, 4)
+
+
+def test_mips_of_block_aligned_png_are_written_with_the_aei(tmp_path):
+    pytest.importorskip("numpy")
+    src = tmp_path / "sprite.png"
+    Image.new("RGBA", (96, 64), (200, 100, 50, 128)).save(src)
+    options = preprocess.Preprocess(mips=True)
+
+    result = core.convert_to_aei(str(src), str(tmp_path), "DXT5", preprocess=options)
+    assert result.status == core.CONVERTED, result.error
+    outputs = batch.outputs_for(core.convert_to_aei, str(src), str(tmp_path), compression_format="DXT5", preprocess=options)
+    assert sorted(dest for dest, _ in outputs) == sorted(str(file_path) for file_path in tmp_path.glob("*.aei"))
@@ -0,0 +1,43 @@
+'''
+Disk cache of the thumbnails.
+'''
+import os
+
+from PIL import Image
+
+from AEIporter import thumbnails
+
+
+def _sprites(tmp_path, count):
+    file_paths = []
+    for index in range(count):
+        file_path = tmp_path / f"{index}.png"
+        Image.effect_noise((64, 64), 64 + index).convert("RGBA").save(file_path)
+        file_paths.append(str(file_path))
+    return file_paths
+
+
+def _disk_usage(folder_path):
+    return sum(path.stat().st_size for path in folder_path.rglob("*.png"))
+
+
+def test_no_disk_folder_keeps_thumbnails_in_memory_only(tmp_path):
+    cache = thumbnails.ThumbnailCache()
+    cache.load(_sprites(tmp_path, 1)[0])
+    assert cache.disk_folder is None
+    assert cache.disk_used is None
+
+
+def test_disk_cache_stays_under_its_budget(tmp_path):
+    disk_folder = tmp_path / "cache"
+    file_paths = _sprites(tmp_path, 8)
+    cache = thumbnails.ThumbnailCache(disk_folder=str(disk_folder))
+    cache.load(file_paths[0])
+    thumbnail_size = _disk_usage(disk_folder)
+    cache.disk_budget = 3 * thumbnail_size
+
+    for file_path in file_paths[1:]:
+        cache.load(file_path)
+        assert _disk_usage(disk_folder) <= cache.disk_budget
+    # the newest thumbnail is never the one removed
+    assert os.path.exists(cache._disk_path(cache.key(file_paths[-1])))